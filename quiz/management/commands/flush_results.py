@@ -0,0 +1,53 @@
+import logging
+
+from django.core.management import BaseCommand
+
+from ...services.write_behind import (
+    ResultFlusher,
+    flush_pending_results,
+    prune_pending_results,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Write queued result submissions and prune old tickets"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            help="Number of queued submissions written per transaction",
+            type=int,
+            default=ResultFlusher.BATCH_SIZE,
+        )
+
+    def handle(self, *args, **options):
+        logger.info("Result flush started")
+        self.stdout.write("Writing queued results...")
+
+        batch_size = options["batch_size"]
+        flushed_count = 0
+
+        while True:
+            results = flush_pending_results(batch_size)
+            flushed_count += len(results)
+
+            if len(results) < batch_size:
+                break
+
+            self.stdout.write(f"{flushed_count} result(s) written")
+
+        pruned_count = prune_pending_results(ResultFlusher.TICKET_RETENTION)
+
+        logger.info(
+            f"Result flush completed - Count: {flushed_count} - "
+            f"Pruned: {pruned_count}"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{flushed_count} result(s) written, "
+                f"{pruned_count} ticket(s) pruned"
+            )
+        )
@@ -0,0 +1,159 @@
+import logging
+from collections import defaultdict
+
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from ...models import Result, AnsweredQuestion
+from ...services.answer_keys import answer_key_cache
+from ...services.answers import pack_answers, unpack_answers
+from ...services.reviews import invalidate_reviews
+from ...services.scoring import calculate_score
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Move result answers from AnsweredQuestion rows into packed arrays"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--unpack",
+            help="Move packed answers back into AnsweredQuestion rows",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            help="Number of results converted per transaction",
+            type=int,
+            default=500,
+        )
+
+    def handle(self, *args, **options):
+        unpack = options["unpack"]
+        action = "unpack" if unpack else "pack"
+
+        logger.info(f"Result answer {action} started")
+        self.stdout.write(f"Converting result answers ({action})...")
+
+        chunk_size = options["chunk_size"]
+        converted_count = 0
+        last_id = 0
+
+        while True:
+            results = list(
+                Result.objects.filter(answers__isnull=not unpack, pk__gt=last_id)
+                .order_by("pk")
+                .only(
+                    "id",
+                    "quiz_id",
+                    "total_answered",
+                    "total_correct",
+                    "percentage_score",
+                    *(["answers"] if unpack else []),
+                )[:chunk_size]
+            )
+
+            if not results:
+                break
+
+            last_id = results[-1].id
+
+            try:
+                with transaction.atomic():
+                    if unpack:
+                        self.unpack_chunk(results)
+                    else:
+                        self.pack_chunk(results)
+            except Exception:
+                logger.error(
+                    f"Result answer {action} failed - Result IDs: "
+                    f"{results[0].id}-{results[-1].id}",
+                    exc_info=True,
+                )
+                self.stdout.write(self.style.ERROR(f"Result answer {action} failed!"))
+                return
+
+            converted_count += len(results)
+            self.stdout.write(f"{converted_count} result(s) converted")
+
+        logger.info(f"Result answer {action} completed - Count: {converted_count}")
+        self.stdout.write(
+            self.style.SUCCESS(f"{converted_count} result(s) have been converted")
+        )
+
+    def pack_chunk(self, results):
+        answers_map = defaultdict(list)
+        answered_questions = (
+            AnsweredQuestion.objects.filter(
+                result_id__in=[result.id for result in results]
+            )
+            .order_by("result_id", "position_in_quiz")
+            .values_list(
+                "result_id",
+                "id",
+                "question_id",
+                "selected_option_id",
+                "position_in_quiz",
+            )
+        )
+
+        for result_id, *answer in answered_questions:
+            answers_map[result_id].append(answer)
+
+        for result in results:
+            answers = answers_map[result.id]
+            result.answers = pack_answers(answers)
+
+            # Packed results are always scored, as the scoring fallbacks
+            # read AnsweredQuestion rows
+            if result.total_answered is None:
+                (
+                    result.total_answered,
+                    result.total_correct,
+                    result.percentage_score,
+                ) = calculate_score(
+                    answer_key_cache.get(result.quiz_id),
+                    (
+                        (question_id, option_id)
+                        for _, question_id, option_id, _ in answers
+                    ),
+                )
+
+        Result.objects.bulk_update(
+            results,
+            ["answers", "total_answered", "total_correct", "percentage_score"],
+        )
+        AnsweredQuestion.objects.filter(result__in=results).delete()
+
+    def unpack_chunk(self, results):
+        answers_map = {result.id: unpack_answers(result.answers) for result in results}
+
+        # Rows are restored with the ids they were packed from, so reviews
+        # stay the same
+        AnsweredQuestion.objects.bulk_create(
+            AnsweredQuestion(
+                id=answer.id,
+                result_id=result.id,
+                question_id=answer.question_id,
+                selected_option_id=answer.selected_option_id,
+                position_in_quiz=answer.position_in_quiz,
+            )
+            for result in results
+            for answer in answers_map[result.id]
+        )
+
+        for result in results:
+            result.answers = None
+
+        Result.objects.bulk_update(results, ["answers"])
+
+        # Answers written packed get new ids, so their reviews are rebuilt
+        invalidate_reviews(
+            pk__in=[
+                result_id
+                for result_id, answers in answers_map.items()
+                if any(answer.id is None for answer in answers)
+            ]
+        )
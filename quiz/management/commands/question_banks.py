@@ -0,0 +1,40 @@
+from django.core.management import BaseCommand
+
+from ...models import Quiz
+from ...services.question_bank import build_question_bank
+from ...services.versions import get_quiz_version
+
+
+class Command(BaseCommand):
+    help = "Report the in-memory size of each quiz's question bank"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--quiz",
+            help="Only report the question bank of this quiz id",
+            type=int,
+        )
+
+    def handle(self, *args, **options):
+        quiz_ids = Quiz.objects.order_by("pk").values_list("id", flat=True)
+
+        if options["quiz"]:
+            quiz_ids = quiz_ids.filter(pk=options["quiz"])
+
+        total_bytes = 0
+
+        for quiz_id in quiz_ids:
+            bank = build_question_bank(quiz_id, get_quiz_version(quiz_id))
+
+            if bank is None:
+                continue
+
+            total_bytes += bank.nbytes
+            self.stdout.write(
+                f"Quiz {quiz_id}: {len(bank.question_ids)} question(s), "
+                f"{len(bank.options)} option(s), {bank.nbytes} bytes"
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Question banks total {total_bytes} bytes")
+        )
@@ -0,0 +1,71 @@
+import logging
+
+from django.core.management import BaseCommand
+
+from ...models import Result
+from ...serializers import ResultSerializer
+from ...services.reviews import review_queryset, store_review
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Build stored review documents for results"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            help="Rebuild every review, not only missing or invalidated ones",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--quiz",
+            help="Only rebuild reviews of results for this quiz id",
+            type=int,
+        )
+        parser.add_argument(
+            "--chunk-size",
+            help="Number of results loaded per query",
+            type=int,
+            default=200,
+        )
+
+    def handle(self, *args, **options):
+        logger.info("Result review rebuild started")
+        self.stdout.write("Rebuilding result reviews...")
+
+        queryset = Result.objects.order_by("pk")
+
+        if not options["all"]:
+            queryset = queryset.filter(review__isnull=True)
+        if options["quiz"]:
+            queryset = queryset.filter(quiz_id=options["quiz"])
+
+        chunk_size = options["chunk_size"]
+        rebuilt_count = 0
+        last_id = 0
+
+        while True:
+            result_ids = list(
+                queryset.filter(pk__gt=last_id).values_list("id", flat=True)[
+                    :chunk_size
+                ]
+            )
+
+            if not result_ids:
+                break
+
+            last_id = result_ids[-1]
+            results = review_queryset().filter(pk__in=result_ids)
+
+            for result in results:
+                store_review(result.id, ResultSerializer(result).data)
+
+            rebuilt_count += len(result_ids)
+            self.stdout.write(f"{rebuilt_count} review(s) rebuilt")
+
+        logger.info(f"Result review rebuild completed - Count: {rebuilt_count}")
+        self.stdout.write(
+            self.style.SUCCESS(f"{rebuilt_count} review(s) have been rebuilt")
+        )
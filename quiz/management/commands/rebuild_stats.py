@@ -0,0 +1,125 @@
+import logging
+from collections import defaultdict
+
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from ...models import (
+    Quiz,
+    Result,
+    AnsweredQuestion,
+    QuizStats,
+    QuizScoreBucket,
+    QuestionStats,
+)
+from ...services.answer_keys import answer_key_cache
+from ...services.answers import unpack_answers
+from ...services.scoring import calculate_score
+from ...services.stats import StatsDelta, ensure_quiz_stats
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Recompute quiz and question statistics from stored results"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--quiz",
+            help="Only rebuild statistics of this quiz id",
+            type=int,
+        )
+        parser.add_argument(
+            "--chunk-size",
+            help="Number of results loaded per query",
+            type=int,
+            default=500,
+        )
+
+    def handle(self, *args, **options):
+        logger.info("Stats rebuild started")
+        self.stdout.write("Rebuilding quiz statistics...")
+
+        quiz_ids = Quiz.objects.order_by("pk").values_list("id", flat=True)
+
+        if options["quiz"]:
+            quiz_ids = quiz_ids.filter(pk=options["quiz"])
+
+        rebuilt_count = 0
+
+        for quiz_id in quiz_ids:
+            attempt_count = self.rebuild_quiz(quiz_id, options["chunk_size"])
+            rebuilt_count += 1
+
+            self.stdout.write(f"Quiz {quiz_id}: {attempt_count} attempt(s)")
+
+        logger.info(f"Stats rebuild completed - Quizzes: {rebuilt_count}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Statistics of {rebuilt_count} quiz(zes) rebuilt")
+        )
+
+    def rebuild_quiz(self, quiz_id, chunk_size):
+        ensure_quiz_stats([quiz_id])
+
+        with transaction.atomic():
+            # Holding the quiz's counter row blocks results saved meanwhile
+            # until the rebuild commits, so they are counted exactly once
+            QuizStats.objects.select_for_update().get(quiz_id=quiz_id)
+
+            delta = StatsDelta()
+            answer_key = answer_key_cache.get(quiz_id)
+            last_id = 0
+
+            while True:
+                results = list(
+                    Result.objects.filter(quiz_id=quiz_id, pk__gt=last_id)
+                    .order_by("pk")
+                    .values("id", "percentage_score", "answers")[:chunk_size]
+                )
+
+                if not results:
+                    break
+
+                last_id = results[-1]["id"]
+
+                for result, answers in self.load_answers(results):
+                    percentage_score = result["percentage_score"]
+
+                    if percentage_score is None:
+                        percentage_score = calculate_score(answer_key, answers)[2]
+
+                    delta.add(quiz_id, percentage_score, answers, answer_key)
+
+            QuizStats.objects.filter(quiz_id=quiz_id).update(
+                attempt_count=0, percentage_total=0
+            )
+            QuizScoreBucket.objects.filter(quiz_id=quiz_id).update(count=0)
+            QuestionStats.objects.filter(quiz_id=quiz_id).delete()
+            delta.apply()
+
+        return delta.attempts[quiz_id]
+
+    def load_answers(self, results):
+        # Yields each result with its (question_id, selected_option_id)
+        # pairs, from either answer layout
+        answers_map = defaultdict(list)
+        answered_questions = AnsweredQuestion.objects.filter(
+            result_id__in=[
+                result["id"] for result in results if result["answers"] is None
+            ]
+        ).values_list("result_id", "question_id", "selected_option_id")
+
+        for result_id, question_id, selected_option_id in answered_questions:
+            answers_map[result_id].append((question_id, selected_option_id))
+
+        for result in results:
+            if result["answers"] is not None:
+                answers = [
+                    (answer.question_id, answer.selected_option_id)
+                    for answer in unpack_answers(result["answers"])
+                ]
+            else:
+                answers = answers_map[result["id"]]
+
+            yield result, answers
@@ -0,0 +1,86 @@
+import logging
+from collections import defaultdict
+
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from ...models import Result, AnsweredQuestion
+from ...services.answer_keys import answer_key_cache
+from ...services.scoring import calculate_score
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Compute and store score totals for results created before scoring"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            help="Number of results scored per transaction",
+            type=int,
+            default=500,
+        )
+
+    def handle(self, *args, **options):
+        logger.info("Result scoring backfill started")
+        self.stdout.write("Scoring unscored results...")
+
+        chunk_size = options["chunk_size"]
+        scored_count = 0
+        last_id = 0
+
+        while True:
+            results = list(
+                Result.objects.filter(total_answered__isnull=True, pk__gt=last_id)
+                .order_by("pk")
+                .only("id", "quiz_id")[:chunk_size]
+            )
+
+            if not results:
+                break
+
+            last_id = results[-1].id
+
+            try:
+                with transaction.atomic():
+                    self.score_chunk(results)
+            except Exception:
+                logger.error(
+                    f"Result scoring failed - Result IDs: "
+                    f"{results[0].id}-{results[-1].id}",
+                    exc_info=True,
+                )
+                self.stdout.write(self.style.ERROR("Result scoring failed!"))
+                return
+
+            scored_count += len(results)
+            self.stdout.write(f"{scored_count} result(s) scored")
+
+        logger.info(f"Result scoring backfill completed - Count: {scored_count}")
+        self.stdout.write(
+            self.style.SUCCESS(f"{scored_count} result(s) have been scored")
+        )
+
+    def score_chunk(self, results):
+        answers_map = defaultdict(list)
+        answered_questions = AnsweredQuestion.objects.filter(
+            result_id__in=[result.id for result in results]
+        ).values_list("result_id", "question_id", "selected_option_id")
+
+        for result_id, question_id, selected_option_id in answered_questions:
+            answers_map[result_id].append((question_id, selected_option_id))
+
+        for result in results:
+            (
+                result.total_answered,
+                result.total_correct,
+                result.percentage_score,
+            ) = calculate_score(
+                answer_key_cache.get(result.quiz_id), answers_map[result.id]
+            )
+
+        Result.objects.bulk_update(
+            results, ["total_answered", "total_correct", "percentage_score"]
+        )
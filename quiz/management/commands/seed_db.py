@@ -1,10 +1,17 @@
+import queue
 import logging
+import threading
 
+from django.conf import settings
 from django.core.management import BaseCommand
 from django.db import transaction
+from django.db.models import Count
 
-from ...models import Quiz, Question, Option
+from ...models import Quiz, Question, Option, HarvestCheckpoint
+from ...services.content_hash import content_hash
 from ...services.opentdb_client import OpenTDBClient, APIClientError
+from ...services.response_cache import ResponseCache
+from ...services.versions import bump_catalogue_version, bump_quiz_version
 
 
 logger = logging.getLogger(__name__)
@@ -13,6 +20,9 @@ logger = logging.getLogger(__name__)
 class Command(BaseCommand):
     help = "Initialise database with public quiz data"
 
+    QUEUE_SIZE = 4  # fetched question batches waiting to be written
+    POLL_INTERVAL = 0.5  # seconds
+
     def add_arguments(self, parser):
         parser.add_argument(
             "max_questions",
@@ -21,6 +31,45 @@ class Command(BaseCommand):
             default=50,
             nargs="?",
         )
+        parser.add_argument(
+            "--all",
+            help="Fetch every question of each category, ignoring max_questions",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--refresh",
+            help="Fetch completed categories again with a new token, adding "
+            "the questions they gained since",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--cache-dir",
+            help="Directory of cached OpenTDB responses",
+            default=settings.OPENTDB_CACHE_DIR,
+        )
+        cache_mode = parser.add_mutually_exclusive_group()
+        cache_mode.add_argument(
+            "--no-cache",
+            help="Fetch every response from OpenTDB without caching it",
+            action="store_const",
+            const=None,
+            dest="cache_mode",
+            default="cache",
+        )
+        cache_mode.add_argument(
+            "--record",
+            help="Fetch every response from OpenTDB and store it in the cache",
+            action="store_const",
+            const="record",
+            dest="cache_mode",
+        )
+        cache_mode.add_argument(
+            "--replay",
+            help="Serve every response from the cache without network access",
+            action="store_const",
+            const="replay",
+            dest="cache_mode",
+        )
 
     def handle(self, *args, **options):
         logger.info("Database seeding operation started")
@@ -30,62 +79,108 @@ class Command(BaseCommand):
         self.question_counter = 0
         self.option_counter = 0
 
+        self.stop_event = threading.Event()
+
         try:
-            api_client = OpenTDBClient()
+            api_client = OpenTDBClient(
+                cancel_event=self.stop_event,
+                response_cache=(
+                    ResponseCache(options["cache_dir"], options["cache_mode"])
+                    if options["cache_mode"]
+                    else None
+                ),
+            )
             categories = api_client.get_categories()
             api_client.set_token()
         except APIClientError:
             logger.error("Request to OpenTDB failed", exc_info=True)
             self.stdout.write(self.style.ERROR("Database seeding operation failed."))
+            api_client.close()
 
             return
 
+        limit = None if options["all"] else options["max_questions"]
+
+        if options["refresh"]:
+            self.reset_checkpoints()
+
+        checkpoints = {
+            checkpoint.category_id: checkpoint
+            for checkpoint in HarvestCheckpoint.objects.all()
+        }
+        categories = [
+            category
+            for category in categories
+            if not self.is_harvested(checkpoints.get(category["id"]), limit)
+        ]
+
         logger.info(f"Total categories count: {len(categories)}")
         self.stdout.write(
             f"Quiz data for {len(categories)} quiz "
             "categories to be written to the database"
         )
 
-        max_questions = options["max_questions"]
+        resumed_count = sum(category["id"] in checkpoints for category in categories)
 
-        for category in categories:
-            available_questions = category["questions_count"]
-            amount = (
-                available_questions
-                if max_questions > available_questions
-                else max_questions
+        if resumed_count:
+            self.stdout.write(
+                f"Resuming {resumed_count} partially fetched category(ies)"
             )
 
-            try:
-                api_questions = api_client.get_questions_for_category(
-                    category_id=category["id"], amount=amount
-                )
-            except APIClientError:
-                logger.error("Request to OpenTDB failed", exc_info=True)
-                continue
+        # Categories are fetched on a background thread, paced by the client's
+        # rate limiter, while this thread writes the batches already fetched.
+        fetched = queue.Queue(maxsize=self.QUEUE_SIZE)
+        fetcher = threading.Thread(
+            target=self.fetch_categories,
+            args=(api_client, categories, checkpoints, limit, fetched),
+            name="opentdb-fetcher",
+            daemon=True,
+        )
+        fetcher.start()
 
-            try:
-                with transaction.atomic():
-                    quiz = Quiz.objects.create(title=category["name"])
-                    self.quiz_counter += 1
+        self.processed_count = 0
+        # The item being written, whose transaction an interrupt rolls back
+        writing = None
 
-                    options_map = self.create_questions(quiz, api_questions)
-                    questions = Question.objects.filter(quiz_id=quiz.id)
-                    self.create_options(questions, options_map)
+        try:
+            while True:
+                item = fetched.get()
 
-                    logger.info(f"Quiz creation successful - Quiz ID: {quiz.id}")
-                    self.stdout.write(
-                        self.style.SUCCESS(
-                            f"`{category['name']}` quiz data written to db successfully!"
-                        )
-                    )
-            except Exception:
-                logger.error(
-                    f"Quiz creation failed - {category['name']}", exc_info=True
-                )
-                self.stdout.write(
-                    self.style.ERROR(f"Quiz creation failed - {category['name']}")
-                )
+                if item is None:
+                    break
+
+                writing = item
+                self.write_item(item, len(categories))
+                writing = None
+        except KeyboardInterrupt:
+            logger.warning("Database seeding operation interrupted")
+            self.stdout.write(
+                self.style.WARNING("Interrupted, stopping the quiz data fetcher...")
+            )
+        finally:
+            self.stop_event.set()
+
+            # Questions served with a checkpointed token are never served with
+            # it again, so the interrupted batch and those fetched before
+            # stopping are still written. A batch that had already committed
+            # adds no questions the second time.
+            if writing is not None:
+                self.write_item(writing, len(categories))
+
+            while True:
+                try:
+                    item = fetched.get_nowait()
+                except queue.Empty:
+                    if not fetcher.is_alive():
+                        break
+
+                    fetcher.join(self.POLL_INTERVAL)
+                    continue
+
+                if item is not None:
+                    self.write_item(item, len(categories))
+
+            api_client.close()
 
         logger.info(
             f"Created quiz count: {self.quiz_counter}, "
@@ -100,43 +195,243 @@ class Command(BaseCommand):
             )
         )
 
-    def calculate_question_tag(self, question):
-        return question.content[:25] + question.content[-25:]
+    def write_item(self, item, category_count):
+        # `exhausted` is None until the category's last item
+        category, api_questions, token, exhausted = item
+        progress = f"[{self.processed_count + 1}/{category_count}]"
 
-    def create_questions(self, quiz, api_questions):
-        questions, options_map = [], {}
+        if api_questions is None:
+            self.processed_count += 1
+            self.stdout.write(
+                self.style.ERROR(
+                    f"{progress} Fetching `{category['name']}` quiz data failed"
+                )
+            )
+            return
 
-        for api_question in api_questions:
-            question = Question(content=api_question["question"], quiz=quiz)
-            questions.append(question)
+        self.write_batch(category, api_questions, token, exhausted, progress)
 
-            api_options = [api_question["correct_answer"]]
-            api_options.extend(api_question["incorrect_answers"])
+        if exhausted is not None:
+            self.processed_count += 1
 
-            tag = self.calculate_question_tag(question)
-            options_map[tag] = api_options
+    def reset_checkpoints(self):
+        # Categories are paged again with the run's token; the questions
+        # already stored are skipped by their content hash
+        question_counts = dict(
+            Question.objects.values("quiz_id")
+            .annotate(count=Count("id"))
+            .values_list("quiz_id", "count")
+        )
+        checkpoints = list(HarvestCheckpoint.objects.all())
 
-        created_questions = Question.objects.bulk_create(questions)
-        self.question_counter += len(created_questions)
+        for checkpoint in checkpoints:
+            checkpoint.fetched_count = question_counts.get(checkpoint.quiz_id, 0)
+            checkpoint.completed = False
+            checkpoint.token = ""
 
-        return options_map
+        HarvestCheckpoint.objects.bulk_update(
+            checkpoints, ["fetched_count", "completed", "token"]
+        )
 
-    def create_options(self, questions, options_map):
-        all_options = []
+    def is_harvested(self, checkpoint, limit):
+        return checkpoint is not None and (
+            checkpoint.completed
+            or (limit is not None and checkpoint.fetched_count >= limit)
+        )
 
-        for question in questions:
-            tag = self.calculate_question_tag(question)
-            api_options = options_map.pop(tag, None)
+    def fetch_categories(self, api_client, categories, checkpoints, limit, fetched):
+        run_token = api_client.session_token
+
+        for category in categories:
+            if self.stop_event.is_set():
+                break
+
+            # A resumed category keeps its token, so OpenTDB skips the
+            # questions already served with it
+            checkpoint = checkpoints.get(category["id"])
+            fetched_count = checkpoint.fetched_count if checkpoint else 0
+            category_limit = None if limit is None else limit - fetched_count
+            remaining = category["questions_count"]
+
+            if checkpoint and checkpoint.token:
+                api_client.session_token = checkpoint.token
+                remaining -= fetched_count
+            else:
+                api_client.session_token = run_token
+
+            try:
+                for api_questions in api_client.harvest_questions(
+                    category["id"], category_limit, remaining
+                ):
+                    item = (category, api_questions, api_client.session_token, None)
 
-            if api_options:
-                for idx, option_text in enumerate(api_options):
-                    all_options.append(
-                        Option(
-                            content=option_text,
-                            is_correct=(idx == 0),
-                            question=question,
+                    fetched.put(item)
+                    fetched_count += len(api_questions)
+            except APIClientError:
+                if self.stop_event.is_set():
+                    break
+
+                logger.error("Request to OpenTDB failed", exc_info=True)
+
+                fetched.put((category, None, None, None))
+                continue
+
+            # Harvests stopped by the limit may be continued by a later run
+            # with a higher one
+            exhausted = limit is None or fetched_count < limit
+            item = (category, [], api_client.session_token, exhausted)
+
+            fetched.put(item)
+
+        fetched.put(None)
+
+    def write_batch(self, category, api_questions, token, exhausted, progress):
+        try:
+            with transaction.atomic():
+                quiz = self.upsert_quiz(category)
+                (
+                    checkpoint,
+                    created,
+                ) = HarvestCheckpoint.objects.select_for_update().get_or_create(
+                    category_id=category["id"], defaults={"quiz": quiz}
+                )
+
+                if created:
+                    self.quiz_counter += 1
+
+                new_count = self.create_questions(quiz, api_questions)
+
+                if new_count:
+                    # bulk_create sends no signals, so invalidate explicitly
+                    transaction.on_commit(
+                        lambda quiz_id=quiz.id: self.invalidate_caches(quiz_id)
+                    )
+
+                checkpoint.quiz = quiz
+                # Counts stored questions, so batches served again (replays,
+                # renewed tokens) do not advance the harvest
+                checkpoint.fetched_count += new_count
+                checkpoint.completed = checkpoint.completed or bool(exhausted)
+
+                if token:
+                    checkpoint.token = token
+
+                checkpoint.save()
+
+                logger.info(
+                    f"Quiz batch written - Quiz ID: {quiz.id} - "
+                    f"Questions: {new_count}"
+                )
+
+                if exhausted is not None:
+                    self.stdout.write(
+                        self.style.SUCCESS(
+                            f"{progress} `{category['name']}` quiz data written "
+                            "to db successfully!"
                         )
                     )
+                else:
+                    self.stdout.write(
+                        f"{progress} `{category['name']}`: "
+                        f"{checkpoint.fetched_count} question(s) fetched"
+                    )
+        except Exception:
+            logger.error(f"Quiz creation failed - {category['name']}", exc_info=True)
+            self.stdout.write(
+                self.style.ERROR(
+                    f"{progress} Quiz creation failed - {category['name']}"
+                )
+            )
+
+    def invalidate_caches(self, quiz_id):
+        bump_quiz_version(quiz_id)
+        bump_catalogue_version()
+
+    def upsert_quiz(self, category):
+        # Keyed by the OpenTDB category, so re-seeding refreshes the quiz
+        # rather than adding another one
+        external_id = f"opentdb:{category['id']}"
+
+        if not Quiz.objects.filter(external_id=external_id).exists():
+            # Quizzes seeded before external ids existed are adopted by title
+            legacy_id = (
+                Quiz.objects.filter(external_id__isnull=True, title=category["name"])
+                .order_by("pk")
+                .values_list("pk", flat=True)
+                .first()
+            )
+
+            if legacy_id is not None:
+                Quiz.objects.filter(pk=legacy_id).update(external_id=external_id)
+                logger.info(
+                    f"Quiz adopted - Quiz ID: {legacy_id} - "
+                    f"External ID: {external_id}"
+                )
+
+        quiz = Quiz(external_id=external_id, title=category["name"])
+        Quiz.objects.bulk_create(
+            [quiz],
+            update_conflicts=True,
+            unique_fields=["external_id"],
+            update_fields=["title"],
+        )
+
+        return quiz
+
+    def create_questions(self, quiz, api_questions):
+        # Only questions whose content hash is new to the quiz are written,
+        # so refreshes cost as much as the questions they add
+        api_questions = {
+            content_hash(api_question["question"]): api_question
+            for api_question in api_questions
+        }
+        existing_hashes = set(
+            Question.objects.filter(
+                quiz=quiz, content_hash__in=list(api_questions)
+            ).values_list("content_hash", flat=True)
+        )
+        new_hashes = [
+            question_hash
+            for question_hash in api_questions
+            if question_hash not in existing_hashes
+        ]
+
+        if not new_hashes:
+            return 0
 
-        created_options = Option.objects.bulk_create(all_options)
+        Question.objects.bulk_create(
+            [
+                Question(
+                    quiz=quiz,
+                    content=api_questions[question_hash]["question"],
+                    content_hash=question_hash,
+                )
+                for question_hash in new_hashes
+            ],
+            ignore_conflicts=True,
+        )
+        self.question_counter += len(new_hashes)
+
+        question_ids = Question.objects.filter(
+            quiz=quiz, content_hash__in=new_hashes
+        ).values_list("content_hash", "id")
+        options = []
+
+        for question_hash, question_id in question_ids:
+            api_question = api_questions[question_hash]
+            api_options = [api_question["correct_answer"]]
+            api_options.extend(api_question["incorrect_answers"])
+
+            for idx, option_text in enumerate(api_options):
+                options.append(
+                    Option(
+                        content=option_text,
+                        is_correct=(idx == 0),
+                        question_id=question_id,
+                    )
+                )
+
+        created_options = Option.objects.bulk_create(options)
         self.option_counter += len(created_options)
+
+        return len(new_hashes)
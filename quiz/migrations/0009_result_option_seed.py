@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 22:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0008_alter_quiz_cover_image"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="result",
+            name="option_seed",
+            field=models.PositiveIntegerField(null=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-17 22:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0009_result_option_seed"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="result",
+            name="percentage_score",
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name="result",
+            name="total_answered",
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name="result",
+            name="total_correct",
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+    ]
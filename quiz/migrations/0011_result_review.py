@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 22:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0010_result_score_totals"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="result",
+            name="review",
+            field=models.BinaryField(null=True),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.4 on 2026-10-17 22:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0011_result_review"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PendingResult",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("option_seed", models.PositiveIntegerField(null=True)),
+                ("duration", models.DurationField(null=True)),
+                ("answered_questions", models.JSONField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("failed", models.BooleanField(default=False)),
+                (
+                    "quiz",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="quiz.quiz"
+                    ),
+                ),
+                (
+                    "result",
+                    models.OneToOneField(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="quiz.result",
+                    ),
+                ),
+            ],
+        ),
+    ]
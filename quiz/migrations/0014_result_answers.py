@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 22:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0013_idempotencykey"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="result",
+            name="answers",
+            field=models.BinaryField(null=True),
+        ),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 5.2.4 on 2026-10-17 22:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0014_result_answers"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="QuizStats",
+            fields=[
+                (
+                    "quiz",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="quiz.quiz",
+                    ),
+                ),
+                ("attempt_count", models.PositiveIntegerField(default=0)),
+                ("percentage_total", models.FloatField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="QuestionStats",
+            fields=[
+                (
+                    "question",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="quiz.question",
+                    ),
+                ),
+                ("answer_count", models.PositiveIntegerField(default=0)),
+                ("correct_count", models.PositiveIntegerField(default=0)),
+                ("correct_rate", models.FloatField(default=0)),
+                (
+                    "quiz",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="quiz.quiz"
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["quiz", "correct_rate"],
+                        name="quiz_questi_quiz_id_e9062c_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="QuizScoreBucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("bucket", models.PositiveSmallIntegerField()),
+                ("count", models.PositiveIntegerField(default=0)),
+                (
+                    "quiz",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="score_buckets",
+                        to="quiz.quiz",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("quiz_id", "bucket"), name="unique_quiz_score_bucket"
+                    )
+                ],
+            },
+        ),
+    ]
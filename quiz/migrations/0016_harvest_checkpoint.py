@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-17 22:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0015_stats"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HarvestCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("category_id", models.PositiveIntegerField(unique=True)),
+                ("token", models.CharField(blank=True, max_length=64)),
+                ("fetched_count", models.PositiveIntegerField(default=0)),
+                ("completed", models.BooleanField(default=False)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "quiz",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE, to="quiz.quiz"
+                    ),
+                ),
+            ],
+        ),
+    ]
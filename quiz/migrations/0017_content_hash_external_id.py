@@ -0,0 +1,75 @@
+# Generated by Django 5.2.4 on 2026-10-17 22:37
+
+from django.db import migrations, models
+
+from quiz.services.content_hash import content_hash
+
+
+BATCH_SIZE = 500
+
+
+def hash_questions(apps, schema_editor):
+    # Later copies of a question already duplicated in its quiz stay
+    # unhashed, as results may reference them
+    Question = apps.get_model("quiz", "Question")
+    seen = set()
+    questions = []
+
+    for question in (
+        Question.objects.order_by("pk")
+        .only("id", "quiz_id", "content")
+        .iterator(chunk_size=BATCH_SIZE)
+    ):
+        question.content_hash = content_hash(question.content)
+
+        if (question.quiz_id, question.content_hash) in seen:
+            continue
+
+        seen.add((question.quiz_id, question.content_hash))
+        questions.append(question)
+
+        if len(questions) == BATCH_SIZE:
+            Question.objects.bulk_update(questions, ["content_hash"])
+            questions = []
+
+    Question.objects.bulk_update(questions, ["content_hash"])
+
+
+def link_harvested_quizzes(apps, schema_editor):
+    Quiz = apps.get_model("quiz", "Quiz")
+    HarvestCheckpoint = apps.get_model("quiz", "HarvestCheckpoint")
+    quizzes = []
+
+    for checkpoint in HarvestCheckpoint.objects.select_related("quiz"):
+        checkpoint.quiz.external_id = f"opentdb:{checkpoint.category_id}"
+        quizzes.append(checkpoint.quiz)
+
+    Quiz.objects.bulk_update(quizzes, ["external_id"], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("quiz", "0016_harvest_checkpoint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="question",
+            name="content_hash",
+            field=models.CharField(max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name="quiz",
+            name="external_id",
+            field=models.CharField(max_length=64, null=True, unique=True),
+        ),
+        migrations.RunPython(hash_questions, migrations.RunPython.noop),
+        migrations.RunPython(link_harvested_quizzes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="question",
+            constraint=models.UniqueConstraint(
+                fields=("quiz", "content_hash"), name="unique_question_content"
+            ),
+        ),
+    ]
@@ -1,7 +1,10 @@
 from django.db import models
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 from cloudinary_storage.storage import MediaCloudinaryStorage
 
+from .services.content_hash import content_hash
+
 
 class Quiz(models.Model):
     title = models.CharField(max_length=255)
@@ -12,6 +15,8 @@ class Quiz(models.Model):
     questions_per_attempt = models.PositiveSmallIntegerField(
         default=15, validators=[MinValueValidator(1), MaxValueValidator(150)]
     )
+    # Source of imported quizzes, e.g. "opentdb:9" for an OpenTDB category
+    external_id = models.CharField(max_length=64, null=True, unique=True)
 
     class Meta:
         verbose_name_plural = "Quizzes"
@@ -23,6 +28,26 @@ class Quiz(models.Model):
 class Question(models.Model):
     content = models.TextField()
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
+    # Hash of the normalized content, kept in sync by save(); null only for
+    # duplicates that existed before the constraint
+    content_hash = models.CharField(max_length=64, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["quiz", "content_hash"], name="unique_question_content"
+            )
+        ]
+
+    def save(self, *args, **kwargs):
+        self.content_hash = content_hash(self.content)
+
+        update_fields = kwargs.get("update_fields")
+
+        if update_fields is not None and "content" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "content_hash"}
+
+        super().save(*args, **kwargs)
 
 
 class Option(models.Model):
@@ -36,6 +61,14 @@ class Option(models.Model):
 class Result(models.Model):
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
     duration = models.DurationField(null=True)
+    option_seed = models.PositiveIntegerField(null=True)
+    total_answered = models.PositiveSmallIntegerField(null=True)
+    total_correct = models.PositiveSmallIntegerField(null=True)
+    percentage_score = models.FloatField(null=True)
+    review = models.BinaryField(null=True)
+    # Answers packed by services.answers, replacing AnsweredQuestion rows
+    # for results written with RESULT_ANSWER_STORAGE = "packed"
+    answers = models.BinaryField(null=True)
 
 
 class AnsweredQuestion(models.Model):
@@ -54,3 +87,79 @@ class AnsweredQuestion(models.Model):
                 fields=["result_id", "position_in_quiz"], name="unique_position_in_quiz"
             )
         ]
+
+
+class PendingResult(models.Model):
+    # A validated submission queued for the write-behind flusher. The row
+    # is kept as a ticket the client polls until it links to its result.
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
+    option_seed = models.PositiveIntegerField(null=True)
+    duration = models.DurationField(null=True)
+    answered_questions = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    result = models.OneToOneField(Result, null=True, on_delete=models.CASCADE)
+    failed = models.BooleanField(default=False)
+
+
+class IdempotencyKey(models.Model):
+    # The stored response of a request sent with an `Idempotency-Key`
+    # header; a row without a status code is a request still in progress.
+    key = models.CharField(max_length=255, unique=True)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    headers = models.JSONField(default=dict)
+    response = models.BinaryField(null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+
+class QuizStats(models.Model):
+    # Counters maintained as results are saved; `rebuild_stats` recomputes
+    # them from the results themselves.
+    quiz = models.OneToOneField(
+        Quiz, on_delete=models.CASCADE, primary_key=True, related_name="stats"
+    )
+    attempt_count = models.PositiveIntegerField(default=0)
+    percentage_total = models.FloatField(default=0)
+
+
+class QuizScoreBucket(models.Model):
+    # Attempts whose percentage score falls in [bucket * 10, bucket * 10 + 10),
+    # with perfect scores counted in the last bucket
+    quiz = models.ForeignKey(
+        Quiz, on_delete=models.CASCADE, related_name="score_buckets"
+    )
+    bucket = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["quiz_id", "bucket"], name="unique_quiz_score_bucket"
+            )
+        ]
+
+
+class QuestionStats(models.Model):
+    question = models.OneToOneField(
+        Question, on_delete=models.CASCADE, primary_key=True, related_name="stats"
+    )
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
+    answer_count = models.PositiveIntegerField(default=0)
+    correct_count = models.PositiveIntegerField(default=0)
+    # Stored so the hardest and easiest questions are an index range scan
+    correct_rate = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=["quiz", "correct_rate"])]
+
+
+class HarvestCheckpoint(models.Model):
+    # Progress of `seed_db` through an OpenTDB category, saved with each
+    # batch of questions so an interrupted run resumes with the same token.
+    # `fetched_count` counts the category's questions stored so far.
+    category_id = models.PositiveIntegerField(unique=True)
+    quiz = models.OneToOneField(Quiz, on_delete=models.CASCADE)
+    token = models.CharField(max_length=64, blank=True)
+    fetched_count = models.PositiveIntegerField(default=0)
+    completed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
@@ -0,0 +1,12 @@
+from django.conf import settings
+
+from rest_framework.pagination import CursorPagination
+
+
+class QuizCursorPagination(CursorPagination):
+    # Keyset pagination on the primary key keeps every page a single
+    # indexed range scan, however large the catalogue grows.
+    ordering = "id"
+    page_size = settings.QUIZ_LIST_PAGE_SIZE
+    page_size_query_param = "limit"
+    max_page_size = settings.QUIZ_LIST_MAX_PAGE_SIZE
@@ -0,0 +1,105 @@
+from django.utils.functional import cached_property
+
+from rest_framework.renderers import JSONRenderer
+
+from .serializers import OptionSerializer, QuestionSerializer
+from .services.lru import LRUCache
+from .services.shuffling import shuffle_options
+
+
+class QuestionFragmentCache:
+    # JSON encodings of question bank entries, keyed by question id and quiz
+    # content version. A question is stored as the bytes of its object up to
+    # the opening bracket of its options list plus the bytes of each option,
+    # so a response can be spliced together in any option order.
+    MAX_BYTES = 16 * 1024 * 1024
+
+    def __init__(self):
+        self._renderer = JSONRenderer()
+        self._cache = LRUCache(
+            self.MAX_BYTES,
+            sizeof=lambda fragments: len(fragments[0])
+            + sum(len(option) for option in fragments[1].values()),
+        )
+
+    def _encode(self, question):
+        data = QuestionSerializer(question, context={"option_seed": 0}).data
+        data["options"] = []
+
+        # The options list is the last member, so cutting its closing
+        # brackets leaves an object that option fragments can be appended to
+        prefix = self._renderer.render(data)[: -len(b"]}")]
+        options = {
+            option.id: self._renderer.render(OptionSerializer(option).data)
+            for option in question.options
+        }
+
+        return prefix, options
+
+    def get(self, question, version):
+        key = (question.id, version)
+        fragments = self._cache.get(key)
+
+        if fragments is None:
+            fragments = self._encode(question)
+            self._cache.set(key, fragments)
+
+        return fragments
+
+    def clear(self):
+        self._cache.clear()
+
+
+question_fragment_cache = QuestionFragmentCache()
+
+
+class EncodedQuestionList:
+    # Response data for a sampled attempt. FragmentJSONRenderer assembles it
+    # from cached fragments; any other consumer gets the regular serializer
+    # output through `data`.
+    def __init__(self, question_bank, questions, context):
+        self.question_bank = question_bank
+        self.questions = questions
+        self.context = context
+
+    @property
+    def question_ids(self):
+        return [question.id for question in self.questions]
+
+    @cached_property
+    def data(self):
+        return QuestionSerializer(self.questions, many=True, context=self.context).data
+
+    def encode(self):
+        option_seed = self.context["option_seed"]
+        encoded_questions = []
+
+        for question in self.questions:
+            prefix, options = question_fragment_cache.get(
+                question, self.question_bank.version
+            )
+            shuffled_options = shuffle_options(
+                question.options, seed=option_seed, question_id=question.id
+            )
+            encoded_questions.append(
+                prefix
+                + b",".join(options[option.id] for option in shuffled_options)
+                + b"]}"
+            )
+
+        return b"[" + b",".join(encoded_questions) + b"]"
+
+
+class FragmentJSONRenderer(JSONRenderer):
+    # Fragments are encoded compactly, so indented output (including the
+    # browsable API's) falls back to encoding the serialized data.
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, EncodedQuestionList):
+            indent = self.get_indent(accepted_media_type, renderer_context or {})
+
+            if indent is None:
+                return data.encode()
+
+            data = data.data
+
+        return super().render(data, accepted_media_type, renderer_context)
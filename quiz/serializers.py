@@ -1,18 +1,90 @@
 import json
 import logging
 
-from django.db import transaction
-from django.utils.functional import cached_property
+from django.core import signing
 
 from rest_framework import serializers
 
 from .models import Option, Question, Quiz, Result, AnsweredQuestion
+from .services.answer_keys import answer_key_cache
+from .services.attempts import read_attempt_token
+from .services.question_bank import question_bank_cache
+from .services.reviews import attach_packed_answers
+from .services.scoring import calculate_score
+from .services.shuffling import shuffle_options
+from .services.submissions import build_result, read_submission, save_results
 
 
 logger = logging.getLogger(__name__)
 
 
-class QuizSerializer(serializers.ModelSerializer):
+def get_options(question):
+    # Questions are either model instances or question bank entries, whose
+    # options are a plain tuple.
+    options = question.options
+    return options if isinstance(options, tuple) else options.all()
+
+
+class SparseFieldsMixin:
+    # Drops every field not listed in the `fields` context entry, so that a
+    # view can serve a subset of the representation.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested_fields = self.context.get("fields", None)
+
+        if requested_fields is not None:
+            for field_name in set(self.fields) - set(requested_fields):
+                self.fields.pop(field_name)
+
+
+class ValuesSerializer:
+    # Read-only counterpart of a ModelSerializer that works from `.values()`
+    # rows instead of model instances. `columns` maps each output field to
+    # its lookup, or to a tuple of lookups for fields computed by a
+    # `get_<field>(row)` method. Output matches the model serializer's field
+    # names and shape, and `fields` in the context is honoured the same way.
+    columns = {}
+
+    def __init__(self, instance=None, many=False, context=None, **kwargs):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+
+        requested_fields = self.context.get("fields", None)
+        self.field_names = [
+            name
+            for name in self.columns
+            if requested_fields is None or name in requested_fields
+        ]
+        self.getters = [
+            (name, getattr(self, f"get_{name}", None)) for name in self.field_names
+        ]
+
+    @property
+    def lookups(self):
+        lookups = {"id"}
+
+        for name in self.field_names:
+            lookup = self.columns[name]
+            lookups.update(lookup if isinstance(lookup, tuple) else (lookup,))
+
+        return sorted(lookups)
+
+    def to_representation(self, row):
+        return {
+            name: getter(row) if getter else row[self.columns[name]]
+            for name, getter in self.getters
+        }
+
+    @property
+    def data(self):
+        if self.many:
+            return [self.to_representation(row) for row in self.instance]
+
+        return self.to_representation(self.instance)
+
+
+class QuizSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     question_count = serializers.IntegerField(source="questions_per_attempt")
 
     class Meta:
@@ -20,6 +92,27 @@ class QuizSerializer(serializers.ModelSerializer):
         fields = ["id", "title", "description", "cover_image", "question_count"]
 
 
+class QuizValuesSerializer(ValuesSerializer):
+    columns = {
+        "id": "id",
+        "title": "title",
+        "description": "description",
+        "cover_image": "cover_image",
+        "question_count": "questions_per_attempt",
+    }
+
+    def get_cover_image(self, row):
+        name = row["cover_image"]
+
+        if not name:
+            return None
+
+        url = Quiz._meta.get_field("cover_image").storage.url(name)
+        request = self.context.get("request", None)
+
+        return request.build_absolute_uri(url) if request is not None else url
+
+
 class SimpleQuizSerializer(serializers.ModelSerializer):
     class Meta:
         model = Quiz
@@ -33,85 +126,134 @@ class OptionSerializer(serializers.ModelSerializer):
 
 
 class QuestionSerializer(serializers.ModelSerializer):
-    options = OptionSerializer(many=True)
+    options = serializers.SerializerMethodField()
 
     class Meta:
         model = Question
         fields = ["id", "content", "options"]
 
+    def get_options(self, obj):
+        options = shuffle_options(
+            get_options(obj), seed=self.context["option_seed"], question_id=obj.id
+        )
+        serializer = OptionSerializer(options, many=True)
+        return serializer.data
+
 
 class SimpleAnsweredQuestionSerializer(serializers.Serializer):
     question_id = serializers.IntegerField()
     option_id = serializers.IntegerField()
-    question_number = serializers.IntegerField()
+    # Stored in a PositiveSmallIntegerField
+    question_number = serializers.IntegerField(min_value=1, max_value=32767)
 
 
 class CreateResultSerializer(serializers.Serializer):
     answered_questions = SimpleAnsweredQuestionSerializer(many=True)
+    seed = serializers.IntegerField(required=False, min_value=0, max_value=2**31 - 1)
+    attempt_token = serializers.CharField(required=False)
 
     def validate_answered_questions(self, answered_questions):
-        errors = {}
-        question_ids, option_ids, question_numbers = [], [], []
-        quiz = self.context["quiz"]
-
         if len(answered_questions) == 0:
             logger.warning(f"Invalid result creation attempted")
             raise serializers.ValidationError(
                 "This field must be a list of one or more items"
             )
 
-        for entry in answered_questions:
-            question_ids.append(entry["question_id"])
-            question_numbers.append(entry["question_number"])
+        return answered_questions
 
-            if entry["option_id"] != 0:
-                option_ids.append(entry["option_id"])
+    def validate_attempt_token(self, attempt_token):
+        quiz = self.context["quiz"]
 
-        if Question.objects.filter(pk__in=question_ids).count() < len(question_ids):
-            errors["question_id"] = "One or more invalid question ids were passed"
-        elif quiz:
-            all_question_ids = Question.objects.filter(quiz=quiz).values_list(
-                "id", flat=True
+        try:
+            attempt = read_attempt_token(attempt_token)
+        except signing.SignatureExpired:
+            raise serializers.ValidationError("Attempt token has expired")
+        except signing.BadSignature:
+            raise serializers.ValidationError("Invalid attempt token")
+
+        if quiz and attempt.quiz_id != quiz.id:
+            raise serializers.ValidationError(
+                f"Attempt token was not issued for quiz of pk `{quiz.id}`"
             )
 
-            if set(question_ids) - set(all_question_ids):
-                errors["question_id"] = (
-                    f"One or more invalid question ids for quiz of pk `{quiz.id}`"
-                )
+        return attempt
 
-        if Option.objects.filter(pk__in=option_ids).count() < len(option_ids):
-            errors["option_id"] = "One or more invalid option ids were passed"
+    def validate(self, attrs):
+        errors = {}
+        quiz = self.context["quiz"]
+        attempt = attrs.get("attempt_token", None)
+        answered_questions = attrs["answered_questions"]
+        question_numbers = [entry["question_number"] for entry in answered_questions]
+        question_ids = [entry["question_id"] for entry in answered_questions]
 
         if len(question_numbers) != len(set(question_numbers)):
             errors["question_number"] = "Question numbers must be unique"
 
+        if len(question_ids) != len(set(question_ids)):
+            errors["question_id"] = "Each question can only be answered once"
+
+        if quiz:
+            # Answers are checked against the quiz's cached question bank, one
+            # dictionary lookup per answer and no queries once it is warm.
+            question_bank = question_bank_cache.get(quiz.id)
+            invalid_questions, invalid_options = [], []
+
+            for entry in answered_questions:
+                question_id, option_id = entry["question_id"], entry["option_id"]
+
+                if question_bank is None or question_id not in question_bank.questions:
+                    invalid_questions.append(
+                        f"Question of pk `{question_id}` does not belong to "
+                        f"quiz of pk `{quiz.id}`"
+                    )
+                elif option_id != 0 and not question_bank.has_option(
+                    question_id, option_id
+                ):
+                    invalid_options.append(
+                        f"Option of pk `{option_id}` does not belong to "
+                        f"question of pk `{question_id}`"
+                    )
+                elif attempt and question_id not in attempt.question_ids:
+                    invalid_questions.append(
+                        f"Question of pk `{question_id}` was not issued for "
+                        "this attempt"
+                    )
+
+            if invalid_questions and "question_id" not in errors:
+                errors["question_id"] = invalid_questions
+            if invalid_options:
+                errors["option_id"] = invalid_options
+
         if errors:
             logger.warning(
                 f"Invalid result creation attempted - Error: {json.dumps(errors)}"
             )
 
-            raise serializers.ValidationError(errors)
+            raise serializers.ValidationError({"answered_questions": errors})
 
-        return answered_questions
+        return attrs
 
     def create(self, validated_data):
-        with transaction.atomic():
-            quiz = self.context["quiz"]
-            result = Result.objects.create(quiz=quiz)
+        submission = build_result(
+            self.context["quiz"], **read_submission(validated_data)
+        )
+        return save_results([submission])[0]
+
 
-            answered_questions = [
-                AnsweredQuestion(
-                    question_id=aq["question_id"],
-                    selected_option_id=aq["option_id"] or None,
-                    position_in_quiz=aq["question_number"],
-                    result=result,
-                )
-                for aq in validated_data["answered_questions"]
-            ]
+class BatchCreateResultSerializer(serializers.Serializer):
+    # Each item is a CreateResultSerializer payload plus the id of its quiz,
+    # validated one by one so that every item gets its own outcome.
+    MAX_RESULTS = 50
 
-            AnsweredQuestion.objects.bulk_create(answered_questions)
+    results = serializers.ListField(
+        child=serializers.DictField(), min_length=1, max_length=MAX_RESULTS
+    )
 
-            return result
+
+class BatchResultItemSerializer(serializers.Serializer):
+    # Validates the quiz of a batch item; the rest of the item is a
+    # CreateResultSerializer payload
+    quiz = serializers.IntegerField(min_value=1)
 
 
 class AnsweredQuestionSerializer(serializers.ModelSerializer):
@@ -131,13 +273,14 @@ class AnsweredQuestionSerializer(serializers.ModelSerializer):
         ]
 
     def get_correct_option(self, obj):
-        options = obj.question.options.all()
-        correct_option = next((opt for opt in options if opt.is_correct))
+        correct_option_id = self.context["answer_key"].get(obj.question_id)
+        options = get_options(obj.question)
+        correct_option = next((opt for opt in options if opt.id == correct_option_id))
         serializer = OptionSerializer(correct_option)
         return serializer.data
 
 
-class ResultSerializer(serializers.ModelSerializer):
+class ResultSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     quiz = SimpleQuizSerializer()
     answered_questions = AnsweredQuestionSerializer(many=True)
     total_answered = serializers.SerializerMethodField()
@@ -155,31 +298,82 @@ class ResultSerializer(serializers.ModelSerializer):
             "percentage_score",
         ]
 
-    @cached_property
-    def _answered_questions(self):
-        return self.instance.answered_questions.all()
+    def to_representation(self, instance):
+        if "answered_questions" in self.fields and instance.answers is not None:
+            attach_packed_answers(instance, question_bank_cache.get(instance.quiz_id))
+
+        if "answered_questions" in self.fields:
+            # Results created without an attempt seed fall back to their own
+            # id so that their option order is at least stable across reviews.
+            option_seed = instance.option_seed
+            self.context["option_seed"] = (
+                option_seed if option_seed is not None else instance.id
+            )
 
-    @cached_property
-    def _total_correct(self):
-        queryset = self._answered_questions
-        serializer = AnsweredQuestionSerializer(queryset, many=True)
-        total_correct = 0
+        if "answered_questions" in self.fields or instance.total_answered is None:
+            self.context["answer_key"] = answer_key_cache.get(instance.quiz_id)
 
-        for aq in serializer.data:
-            selected_option = aq.get("selected_option", None)
-            if selected_option and aq["correct_option"]["id"] == selected_option["id"]:
-                total_correct += 1
+        return super().to_representation(instance)
 
-        return total_correct
+    def _get_score(self, obj):
+        # Results are scored when created; rows that predate the score
+        # columns are scored on the fly until `score_results` backfills them.
+        if obj.total_answered is not None:
+            return obj.total_answered, obj.total_correct, obj.percentage_score
+
+        answers = (
+            (aq.question_id, aq.selected_option_id)
+            for aq in obj.answered_questions.all()
+        )
+        return calculate_score(self.context["answer_key"], answers)
 
     def get_total_answered(self, obj):
-        return len(self._answered_questions)
+        return self._get_score(obj)[0]
 
     def get_total_correct(self, obj):
-        return self._total_correct
+        return self._get_score(obj)[1]
 
     def get_percentage_score(self, obj):
-        total_answered = len(self._answered_questions)
-        total_correct = self._total_correct
-
-        return round((total_correct / total_answered) * 100, 1) if total_answered else 0
+        return self._get_score(obj)[2]
+
+
+class ResultValuesSerializer(ValuesSerializer):
+    # Answered questions are served from the stored review document, so only
+    # the summary fields are available here.
+    SCORE_COLUMNS = (
+        "id",
+        "quiz_id",
+        "total_answered",
+        "total_correct",
+        "percentage_score",
+    )
+
+    columns = {
+        "id": "id",
+        "quiz": ("quiz_id", "quiz__title"),
+        "total_answered": SCORE_COLUMNS,
+        "total_correct": SCORE_COLUMNS,
+        "percentage_score": SCORE_COLUMNS,
+    }
+
+    def get_quiz(self, row):
+        return {"id": row["quiz_id"], "title": row["quiz__title"]}
+
+    def _get_score(self, row):
+        # Rows that predate the score columns are scored on the fly
+        if row["total_answered"] is not None:
+            return row["total_answered"], row["total_correct"], row["percentage_score"]
+
+        answers = AnsweredQuestion.objects.filter(result_id=row["id"]).values_list(
+            "question_id", "selected_option_id"
+        )
+        return calculate_score(answer_key_cache.get(row["quiz_id"]), answers)
+
+    def get_total_answered(self, row):
+        return self._get_score(row)[0]
+
+    def get_total_correct(self, row):
+        return self._get_score(row)[1]
+
+    def get_percentage_score(self, row):
+        return self._get_score(row)[2]
@@ -0,0 +1,49 @@
+import sys
+import logging
+
+from ..models import Option
+from .cache import TieredCache
+from .versions import get_quiz_version
+
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_answer_key_size(answer_key):
+    # Each entry holds two boxed ints (question id, option id)
+    return sys.getsizeof(answer_key) + len(answer_key) * 2 * sys.getsizeof(2**40)
+
+
+class AnswerKeyCache:
+    MAX_BYTES = 8 * 1024 * 1024
+    TTL = 60 * 60  # seconds
+
+    def __init__(self):
+        self._cache = TieredCache(
+            "answer-key", self.MAX_BYTES, sizeof=estimate_answer_key_size
+        )
+
+    def _build(self, quiz_id):
+        correct_options = Option.objects.filter(
+            question__quiz_id=quiz_id, is_correct=True
+        ).values_list("question_id", "id")
+        answer_key = dict(correct_options)
+
+        logger.debug(f"Answer key built - Quiz ID: {quiz_id} - Size: {len(answer_key)}")
+        return answer_key
+
+    def get(self, quiz_id):
+        # Keys are versioned by the quiz's content version, which Question
+        # and Option writes bump, so stale keys are never read.
+        return self._cache.get_or_build(
+            quiz_id,
+            lambda: self._build(quiz_id),
+            version=get_quiz_version(quiz_id),
+            ttl=self.TTL,
+        )
+
+    def clear(self):
+        self._cache.clear()
+
+
+answer_key_cache = AnswerKeyCache()
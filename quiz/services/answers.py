@@ -0,0 +1,42 @@
+import sys
+from array import array
+from collections import namedtuple
+
+
+PackedAnswer = namedtuple(
+    "PackedAnswer", ["id", "question_id", "selected_option_id", "position_in_quiz"]
+)
+
+
+def pack_answers(answers):
+    # Packs (answered question id, question id, selected option id, position)
+    # tuples into little-endian int64s, 32 bytes per answer. The id is that
+    # of the AnsweredQuestion row the answer was packed from, so packing and
+    # unpacking keep reviews unchanged. Answers that never had a row and
+    # unanswered questions are stored with an id and option id of 0.
+    packed = array("q")
+
+    for answer_id, question_id, selected_option_id, position_in_quiz in answers:
+        packed.extend(
+            (answer_id or 0, question_id, selected_option_id or 0, position_in_quiz)
+        )
+
+    if sys.byteorder == "big":
+        packed.byteswap()
+
+    return packed.tobytes()
+
+
+def unpack_answers(data):
+    packed = array("q")
+    packed.frombytes(bytes(data))
+
+    if sys.byteorder == "big":
+        packed.byteswap()
+
+    return [
+        PackedAnswer(
+            packed[i] or None, packed[i + 1], packed[i + 2] or None, packed[i + 3]
+        )
+        for i in range(0, len(packed), 4)
+    ]
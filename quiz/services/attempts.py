@@ -0,0 +1,39 @@
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from django.core import signing
+
+
+ATTEMPT_TOKEN_SALT = "quiz.attempt"
+ATTEMPT_TOKEN_MAX_AGE = 60 * 60 * 24  # seconds
+
+Attempt = namedtuple(
+    "Attempt", ["quiz_id", "question_ids", "option_seed", "started_at"]
+)
+
+
+def mint_attempt_token(quiz_id, question_ids, option_seed):
+    payload = {
+        "quiz": quiz_id,
+        "questions": list(question_ids),
+        "seed": option_seed,
+        "started": time.time(),
+    }
+
+    return signing.dumps(payload, salt=ATTEMPT_TOKEN_SALT, compress=True)
+
+
+def read_attempt_token(token):
+    # Raises signing.BadSignature (or its subclass SignatureExpired) for
+    # tampered or stale tokens.
+    payload = signing.loads(
+        token, salt=ATTEMPT_TOKEN_SALT, max_age=ATTEMPT_TOKEN_MAX_AGE
+    )
+
+    return Attempt(
+        quiz_id=payload["quiz"],
+        question_ids=frozenset(payload["questions"]),
+        option_seed=payload["seed"],
+        started_at=datetime.fromtimestamp(payload["started"], tz=timezone.utc),
+    )
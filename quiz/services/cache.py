@@ -0,0 +1,106 @@
+import time
+import pickle
+import logging
+import threading
+
+from django.core.cache import caches
+
+from .lru import LRUCache
+
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+
+def estimate_size(value):
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+class TieredCache:
+    # A bounded in-process LRU in front of a shared Django cache backend.
+    # Keys carry a content version, so bumping the version invalidates
+    # every tier at once. Rebuilds of a cold key are coalesced: one thread
+    # per process waits on a striped lock, and one process across the fleet
+    # holds a short-lived lock key in the shared backend while the others
+    # poll for its result.
+    LOCK_STRIPES = 64
+    LOCK_TIMEOUT = 30  # seconds
+    LOCK_WAIT = 5  # seconds
+    POLL_INTERVAL = 0.05  # seconds
+
+    def __init__(self, namespace, max_bytes, sizeof=estimate_size, backend="default"):
+        self.namespace = namespace
+        self.backend = backend
+        self._local = LRUCache(max_bytes, sizeof=lambda entry: sizeof(entry[0]))
+        self._locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+
+    @property
+    def shared(self):
+        return caches[self.backend]
+
+    def make_key(self, key, version):
+        return f"{self.namespace}:{key}:v{version}"
+
+    def get_or_build(self, key, builder, version=0, ttl=300):
+        cache_key = self.make_key(key, version)
+        value = self._get_local(cache_key)
+
+        if value is not MISSING:
+            return value
+
+        with self._locks[hash(cache_key) % self.LOCK_STRIPES]:
+            value = self._get_local(cache_key)
+
+            if value is MISSING:
+                value = self._get_shared_or_build(cache_key, builder, ttl)
+                self._local.set(cache_key, (value, time.monotonic() + ttl))
+
+        return value
+
+    def clear(self):
+        self._local.clear()
+
+    def _get_local(self, cache_key):
+        entry = self._local.get(cache_key)
+
+        if entry is None:
+            return MISSING
+
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            self._local.pop(cache_key)
+            return MISSING
+
+        return value
+
+    def _get_shared_or_build(self, cache_key, builder, ttl):
+        value = self.shared.get(cache_key, MISSING)
+
+        if value is not MISSING:
+            return value
+
+        lock_key = f"{cache_key}:lock"
+
+        if self.shared.add(lock_key, 1, timeout=self.LOCK_TIMEOUT):
+            try:
+                value = builder()
+                self.shared.set(cache_key, value, timeout=ttl)
+            finally:
+                self.shared.delete(lock_key)
+
+            logger.debug(f"Cache entry rebuilt - Key: {cache_key}")
+            return value
+
+        deadline = time.monotonic() + self.LOCK_WAIT
+
+        while time.monotonic() < deadline:
+            time.sleep(self.POLL_INTERVAL)
+            value = self.shared.get(cache_key, MISSING)
+
+            if value is not MISSING:
+                return value
+
+        # The lock holder is too slow (or died); build without it
+        logger.warning(f"Cache rebuild wait timed out - Key: {cache_key}")
+        return builder()
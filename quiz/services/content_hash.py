@@ -0,0 +1,14 @@
+import html
+import hashlib
+import unicodedata
+
+
+def normalize_content(content):
+    # OpenTDB serves HTML-escaped text, and the same question may come back
+    # with different entities, case or spacing
+    content = unicodedata.normalize("NFKC", html.unescape(content))
+    return " ".join(content.casefold().split())
+
+
+def content_hash(content):
+    return hashlib.sha256(normalize_content(content).encode()).hexdigest()
@@ -0,0 +1,89 @@
+import time
+import random
+import logging
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from ..models import IdempotencyKey
+
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyStore:
+    TTL = timedelta(hours=24)
+    # A claim older than this is assumed to belong to a crashed request;
+    # well above gunicorn's 30 second worker timeout, so the claims of slow
+    # requests still running are not taken over
+    LOCK_TIMEOUT = timedelta(minutes=5)
+    LOCK_WAIT = 10  # seconds a duplicate waits for the original to finish
+    POLL_INTERVAL = 0.05  # seconds
+    # Share of claims that also delete expired keys
+    CULL_PROBABILITY = 0.01
+
+    def claim(self, key, fingerprint):
+        # Returns `(record, True)` when this request owns the key and must
+        # complete or release it, `(record, False)` with the stored response
+        # of a finished request, and `(None, False)` if the request holding
+        # the key is still running after LOCK_WAIT.
+        if random.random() < self.CULL_PROBABILITY:
+            self.cull()
+
+        deadline = time.monotonic() + self.LOCK_WAIT
+
+        while True:
+            try:
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(
+                        key=key, fingerprint=fingerprint
+                    )
+                return record, True
+            except IntegrityError:
+                pass
+
+            record = IdempotencyKey.objects.filter(key=key).first()
+            now = timezone.now()
+
+            # A missing record means the key was released in between, or
+            # the insert failed for another reason; either way the retry
+            # waits like a duplicate rather than spinning
+            if record is not None:
+                if record.created_at < now - self.TTL or (
+                    record.status_code is None
+                    and record.created_at < now - self.LOCK_TIMEOUT
+                ):
+                    IdempotencyKey.objects.filter(
+                        pk=record.pk, created_at=record.created_at
+                    ).delete()
+                    continue
+
+                if record.status_code is not None:
+                    return record, False
+
+            if time.monotonic() >= deadline:
+                return None, False
+
+            time.sleep(self.POLL_INTERVAL)
+
+    def complete(self, record, status_code, headers, response):
+        # A claim taken over by a retry is left to the retry
+        if not IdempotencyKey.objects.filter(
+            pk=record.pk, created_at=record.created_at
+        ).update(status_code=status_code, headers=headers, response=response):
+            logger.warning(f"Idempotency key claim lost - Key: {record.key}")
+
+    def release(self, record):
+        IdempotencyKey.objects.filter(pk=record.pk).delete()
+
+    def cull(self):
+        deleted_count, _ = IdempotencyKey.objects.filter(
+            created_at__lt=timezone.now() - self.TTL
+        ).delete()
+
+        if deleted_count:
+            logger.info(f"Idempotency keys culled - Count: {deleted_count}")
+
+
+idempotency_store = IdempotencyStore()
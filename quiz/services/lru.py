@@ -0,0 +1,64 @@
+import sys
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    def __init__(self, max_bytes, sizeof=sys.getsizeof):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.current_bytes = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, _ = self._entries[key]
+            except KeyError:
+                return default
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        size = self.sizeof(value)
+
+        with self._lock:
+            self._discard(key)
+
+            # A value larger than the whole budget is never worth keeping
+            if size > self.max_bytes:
+                return
+
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+
+    def pop(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def items(self):
+        with self._lock:
+            return [(key, value) for key, (value, _) in self._entries.items()]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+
+        if entry is not None:
+            self.current_bytes -= entry[1]
@@ -1,5 +1,10 @@
-import time, logging, json
+import random
+import logging, json
 import requests
+from requests.adapters import HTTPAdapter
+
+from .rate_limit import TokenBucket
+from .response_cache import ResponseCacheMiss
 
 
 logger = logging.getLogger(__name__)
@@ -10,10 +15,26 @@ class APIClientError(Exception):
         return super().__init__(message)
 
 
+class APIResponseError(APIClientError):
+    def __init__(self, response_code):
+        self.response_code = response_code
+        return super().__init__(f"OpenTDB response code {response_code}")
+
+
 class OpenTDBClient:
     BASE_URL = "https://opentdb.com"
     TIMEOUT = 30  # seconds
     RETRIES = 3
+    # OpenTDB allows one request per IP every five seconds
+    RATE_INTERVAL = 5  # seconds
+    POOL_SIZE = 4
+
+    # Pause after a failed request, doubled for each consecutive failure and
+    # halved again for each success
+    BACKOFF_BASE = 6  # seconds
+    BACKOFF_MAX = 120  # seconds
+    # Random share of the pause removed so clients do not retry in lockstep
+    BACKOFF_JITTER = 0.5
 
     # Success code
     SUCCESS = 0
@@ -25,62 +46,140 @@ class OpenTDBClient:
     SPENT_TOKEN = 4
     TOO_MANY_REQUESTS = 5
 
-    def __init__(self):
-        self.first_use = True
+    # Codes describing the session token's progress through a category
+    # rather than a failed request; they are cached like successes
+    PAGING_CODES = (AMOUNT_TOO_LARGE, SPENT_TOKEN)
+    MAX_AMOUNT = 50  # questions per request
+
+    TRANSIENT_ERRORS = (
+        requests.exceptions.ConnectionError,
+        requests.exceptions.Timeout,
+    )
+
+    def __init__(self, cancel_event=None, base_url=None, response_cache=None):
+        self.base_url = base_url or self.BASE_URL
         self.session_token = None
-        self.delay = 6  # seconds
+        self.backoff = 0  # seconds
+        self.rate_limiter = TokenBucket(rate=1 / self.RATE_INTERVAL)
+        # Set to abandon requests still waiting for the rate limiter
+        self.cancel_event = cancel_event
+        self.response_cache = response_cache
+
+        # Keeps connections alive between calls instead of a TLS handshake
+        # per request
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.POOL_SIZE, pool_maxsize=self.POOL_SIZE
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        self.session.close()
 
     def call_endpoint(self, path, params=None):
-        if not self.first_use:
-            time.sleep(self.delay)
-        else:
-            self.first_use = False
+        if not self.rate_limiter.acquire(self.cancel_event):
+            raise APIClientError("OpenTDB request cancelled")
 
         logger.debug(
             f"Calling OpenTDB API - METHOD: GET - "
-            f"URL: {self.BASE_URL + path} - "
+            f"URL: {self.base_url + path} - "
             f"PARAMS: {params}"
         )
-        response = requests.get(
-            self.BASE_URL + path, params=params, timeout=self.TIMEOUT
+        response = self.session.get(
+            self.base_url + path, params=params, timeout=self.TIMEOUT
         )
         response.raise_for_status()
         return response.json()
 
+    def is_transient(self, error):
+        if isinstance(error, self.TRANSIENT_ERRORS):
+            return True
+
+        response = getattr(error, "response", None)
+
+        return response is not None and (
+            response.status_code == 429 or response.status_code >= 500
+        )
+
+    def back_off(self):
+        self.backoff = min(max(self.backoff * 2, self.BACKOFF_BASE), self.BACKOFF_MAX)
+        pause = self.backoff * (1 - random.random() * self.BACKOFF_JITTER)
+
+        logger.info(f"OpenTDB backing off - Pause: {pause:.1f}s")
+        self.rate_limiter.pause(pause)
+
+    def recover(self):
+        self.backoff /= 2
+
+        if self.backoff < self.BACKOFF_BASE:
+            self.backoff = 0
+
     def call_endpoint_safely(self, path, params=None):
+        if self.response_cache is None:
+            result = self.request_safely(path, params)
+        else:
+            try:
+                result = self.response_cache.get_or_fetch(
+                    path, params, self.request_safely
+                )
+            except ResponseCacheMiss as error:
+                logger.error(str(error))
+                raise APIClientError(str(error))
+
+        tdb_response_code = result.get("response_code", self.SUCCESS)
+
+        if tdb_response_code != self.SUCCESS:
+            raise APIResponseError(tdb_response_code)
+
+        return result
+
+    def request_safely(self, path, params=None):
         for trial in range(self.RETRIES + 1):
+            last_trial = trial == self.RETRIES
+
             try:
                 result = self.call_endpoint(path, params=params)
-                tdb_response_code = result.get("response_code")
-
-                if tdb_response_code:
-                    if tdb_response_code == self.SUCCESS:
-                        return result
-                    elif tdb_response_code == self.TOO_MANY_REQUESTS:
-                        if trial == self.RETRIES:
-                            logger.warning(
-                                f"OpenTDB request unsuccessful - PATH: {path} - "
-                                f"PARAMS: {params} - reason: Too many requests"
-                            )
-                            raise APIClientError()
-
-                        self.delay = self.delay * 2
-                        continue
-                    else:
-                        logger.error(
-                            f"OpenTDB request unsuccessful - PATH: {path} - "
-                            f"PARAMS: {params} - reason: not specified"
-                        )
-                        raise APIClientError()
+            except requests.exceptions.RequestException as error:
+                if last_trial or not self.is_transient(error):
+                    logger.error(
+                        f"OpenTDB request failed - PATH: {path} - " f"PARAMS: {params}",
+                        exc_info=True,
+                    )
+                    raise APIClientError()
+
+                logger.warning(
+                    f"OpenTDB request failed, retrying - PATH: {path} - "
+                    f"PARAMS: {params} - Trial: {trial + 1} - reason: {error}"
+                )
+                self.back_off()
+                continue
 
+            # Count and category endpoints carry no response code
+            tdb_response_code = result.get("response_code", self.SUCCESS)
+
+            if tdb_response_code == self.SUCCESS or (
+                tdb_response_code in self.PAGING_CODES
+            ):
+                self.recover()
                 return result
-            except requests.exceptions.RequestException:
+
+            if tdb_response_code != self.TOO_MANY_REQUESTS:
                 logger.error(
-                    f"OpenTDB request failed - PATH: {path} - " f"PARAMS: {params}",
-                    exc_info=True,
+                    f"OpenTDB request unsuccessful - PATH: {path} - "
+                    f"PARAMS: {params} - reason: response code {tdb_response_code}"
+                )
+                raise APIResponseError(tdb_response_code)
+
+            if last_trial:
+                logger.warning(
+                    f"OpenTDB request unsuccessful - PATH: {path} - "
+                    f"PARAMS: {params} - reason: Too many requests"
                 )
                 raise APIClientError()
 
+            self.back_off()
+
     def get_categories(self):
         logger.info("Fetching OpenTDB global category count data")
         global_count_result = self.call_endpoint_safely("/api_count_global.php")
@@ -117,3 +216,55 @@ class OpenTDBClient:
         result = self.call_endpoint_safely("/api.php", params=params)
 
         return result["results"]
+
+    def harvest_questions(self, category_id, limit=None, remaining=None):
+        # Yields batches of the category's questions not yet served with the
+        # session token, until the token is spent or `limit` were yielded.
+        # `remaining` is OpenTDB's count of questions the token has left.
+        max_amount = self.MAX_AMOUNT
+        fetched_count = 0
+        token_renewed = False
+
+        while (limit is None or fetched_count < limit) and (
+            remaining is None or remaining > 0
+        ):
+            amount = min(
+                max_amount,
+                remaining if remaining is not None else max_amount,
+                limit - fetched_count if limit is not None else max_amount,
+            )
+
+            try:
+                api_questions = self.get_questions_for_category(category_id, amount)
+            except APIResponseError as error:
+                if error.response_code == self.AMOUNT_TOO_LARGE and amount > 1:
+                    # OpenTDB's count was too high; fewer questions are left
+                    # than requested
+                    max_amount = amount // 2
+                    continue
+
+                if error.response_code in self.PAGING_CODES:
+                    return
+
+                if error.response_code == self.INVALID_TOKEN and not token_renewed:
+                    logger.warning(
+                        f"OpenTDB session token expired - "
+                        f"OpenTDB Category ID: {category_id}"
+                    )
+                    self.set_token()
+                    token_renewed = True
+                    # The new token starts the category over
+                    remaining = None
+                    continue
+
+                raise
+
+            if not api_questions:
+                return
+
+            fetched_count += len(api_questions)
+
+            if remaining is not None:
+                remaining -= len(api_questions)
+
+            yield api_questions
@@ -0,0 +1,138 @@
+import sys
+import logging
+from array import array
+from collections import namedtuple
+
+from ..models import Quiz, Question, Option
+from .cache import TieredCache
+from .versions import get_quiz_version
+
+
+logger = logging.getLogger(__name__)
+
+QuestionEntry = namedtuple("QuestionEntry", ["id", "content", "options"])
+OptionEntry = namedtuple("OptionEntry", ["id", "content", "is_correct"])
+
+
+class QuestionBank:
+    # Immutable snapshot of one quiz's questions and options at one content
+    # version. Question and option entries are tuples; the dicts are indexes
+    # over them and are never mutated after construction.
+    __slots__ = [
+        "quiz_id",
+        "version",
+        "questions_per_attempt",
+        "question_ids",
+        "questions",
+        "options",
+        "nbytes",
+    ]
+
+    def __init__(self, quiz_id, version, questions_per_attempt, questions):
+        self.quiz_id = quiz_id
+        self.version = version
+        self.questions_per_attempt = questions_per_attempt
+        self.question_ids = array("q", (question.id for question in questions))
+        self.questions = {question.id: question for question in questions}
+        self.options = {
+            option.id: option for question in questions for option in question.options
+        }
+        self.nbytes = self._measure()
+
+    def has_option(self, question_id, option_id):
+        question = self.questions.get(question_id, None)
+
+        if question is None:
+            return False
+
+        return any(option.id == option_id for option in question.options)
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def _measure(self):
+        nbytes = (
+            sys.getsizeof(self.question_ids)
+            + sys.getsizeof(self.questions)
+            + sys.getsizeof(self.options)
+        )
+
+        for question in self.questions.values():
+            nbytes += sys.getsizeof(question) + sys.getsizeof(question.content)
+            nbytes += sys.getsizeof(question.options)
+
+            for option in question.options:
+                nbytes += sys.getsizeof(option) + sys.getsizeof(option.content)
+
+        return nbytes
+
+
+def build_question_bank(quiz_id, version):
+    questions_per_attempt = (
+        Quiz.objects.filter(pk=quiz_id)
+        .values_list("questions_per_attempt", flat=True)
+        .first()
+    )
+
+    if questions_per_attempt is None:
+        return None
+
+    options_map = {}
+    options = (
+        Option.objects.filter(question__quiz_id=quiz_id)
+        .order_by("id")
+        .values_list("question_id", "id", "content", "is_correct")
+    )
+
+    for question_id, option_id, content, is_correct in options:
+        options_map.setdefault(question_id, []).append(
+            OptionEntry(option_id, content, is_correct)
+        )
+
+    questions = [
+        QuestionEntry(question_id, content, tuple(options_map.get(question_id, ())))
+        for question_id, content in Question.objects.filter(quiz_id=quiz_id)
+        .order_by("id")
+        .values_list("id", "content")
+    ]
+
+    bank = QuestionBank(quiz_id, version, questions_per_attempt, questions)
+
+    logger.info(
+        f"Question bank built - Quiz ID: {quiz_id} - "
+        f"Questions: {len(questions)} - Size: {bank.nbytes} bytes"
+    )
+    return bank
+
+
+class QuestionBankCache:
+    MAX_BYTES = 64 * 1024 * 1024
+    TTL = 60 * 60  # seconds
+
+    def __init__(self):
+        self._cache = TieredCache(
+            "question-bank",
+            self.MAX_BYTES,
+            sizeof=lambda bank: getattr(bank, "nbytes", 0),
+        )
+
+    def get(self, quiz_id):
+        # Returns None for quizzes that do not exist
+        version = get_quiz_version(quiz_id)
+
+        return self._cache.get_or_build(
+            quiz_id,
+            lambda: build_question_bank(quiz_id, version),
+            version=version,
+            ttl=self.TTL,
+        )
+
+    def clear(self):
+        self._cache.clear()
+
+
+question_bank_cache = QuestionBankCache()
@@ -0,0 +1,44 @@
+import time
+import threading
+
+
+class TokenBucket:
+    # Allows `rate` acquisitions per second on average, with bursts of up
+    # to `capacity`. Waits are cancellable through an optional event.
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    def acquire(self, cancel_event=None):
+        # Returns False if `cancel_event` was set while waiting
+        while True:
+            with self._lock:
+                self._refill()
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+
+                wait = (1 - self.tokens) / self.rate
+
+            if cancel_event is None:
+                time.sleep(wait)
+            elif cancel_event.wait(wait):
+                return False
+
+    def pause(self, seconds):
+        # Empties the bucket and holds back refills for `seconds`, e.g. after
+        # the server reported too many requests
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.tokens, 0) - seconds * self.rate
@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCacheMiss(Exception):
+    pass
+
+
+class ResponseCache:
+    # Stores successful OpenTDB responses as JSON files named by a hash of
+    # the request. Repeated identical requests (e.g. question batches drawn
+    # with a session token) are told apart by their order within the run,
+    # so a replayed run gets the responses in the order they were recorded.
+    #
+    # Modes: "cache" serves fresh entries and fetches the rest, "record"
+    # always fetches and stores, "replay" never touches the network.
+    MODES = ("cache", "record", "replay")
+
+    # Session tokens change every run and must not change the keys
+    IGNORED_PARAMS = ("token",)
+
+    DEFAULT_TTL = 30 * 24 * 3600  # seconds
+    TTLS = {
+        "/api_count_global.php": 24 * 3600,
+        "/api_category.php": 7 * 24 * 3600,
+        # Tokens expire after six hours of inactivity on OpenTDB, so they are
+        # recorded for replays but always requested anew otherwise
+        "/api_token.php": 0,
+    }
+
+    def __init__(self, directory, mode="cache"):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown response cache mode: {mode}")
+
+        self.directory = Path(directory)
+        self.mode = mode
+        self.sequences = Counter()
+
+    def key(self, path, params):
+        request = json.dumps(
+            [
+                path,
+                sorted(
+                    (name, str(value))
+                    for name, value in (params or {}).items()
+                    if name not in self.IGNORED_PARAMS
+                ),
+            ]
+        )
+        self.sequences[request] += 1
+
+        return hashlib.sha256(
+            f"{request}#{self.sequences[request]}".encode()
+        ).hexdigest()
+
+    def is_paged(self, params):
+        return "token" in (params or {})
+
+    def file_path(self, key):
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get_or_fetch(self, path, params, fetch):
+        key = self.key(path, params)
+
+        # Batches paged with a session token depend on how far the token has
+        # been paged, which the key cannot tell, so only replays reuse them
+        if self.mode == "replay" or (
+            self.mode == "cache" and not self.is_paged(params)
+        ):
+            entry = self.read(key)
+            ttl = self.TTLS.get(path, self.DEFAULT_TTL)
+
+            if entry is not None and (
+                self.mode == "replay" or time.time() - entry["stored_at"] < ttl
+            ):
+                logger.debug(f"OpenTDB response served from cache - PATH: {path}")
+                return entry["response"]
+
+            if self.mode == "replay":
+                raise ResponseCacheMiss(
+                    f"No recorded OpenTDB response - PATH: {path} - PARAMS: {params}"
+                )
+
+        response = fetch(path, params)
+        self.write(key, path, response)
+
+        return response
+
+    def read(self, key):
+        try:
+            with open(self.file_path(key), encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            logger.warning(f"Unreadable OpenTDB cache entry - Key: {key}")
+            return None
+
+    def write(self, key, path, response):
+        file_path = self.file_path(key)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Written aside and renamed, so readers never see partial entries
+        fd, temp_path = tempfile.mkstemp(dir=file_path.parent, suffix=".tmp")
+
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump(
+                    {"path": path, "stored_at": time.time(), "response": response},
+                    file,
+                )
+            os.replace(temp_path, file_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
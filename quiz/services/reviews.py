@@ -0,0 +1,130 @@
+from collections import namedtuple
+
+from django.db.models import Prefetch
+
+from rest_framework.renderers import JSONRenderer
+
+from ..models import Option, Result, AnsweredQuestion
+from .answers import unpack_answers
+
+
+AnsweredEntry = namedtuple(
+    "AnsweredEntry",
+    [
+        "id",
+        "question_id",
+        "question",
+        "selected_option_id",
+        "selected_option",
+        "position_in_quiz",
+    ],
+)
+
+
+def review_queryset():
+    ordered_questions_prefetch = Prefetch(
+        "answered_questions",
+        queryset=AnsweredQuestion.objects.order_by("position_in_quiz"),
+    )
+    all_options_prefetch = Prefetch(
+        "answered_questions__question__options",
+        queryset=Option.objects.order_by("id"),
+    )
+    return (
+        Result.objects.defer("review")
+        .select_related("quiz")
+        .prefetch_related(
+            ordered_questions_prefetch,
+            "answered_questions__selected_option",
+            all_options_prefetch,
+        )
+    )
+
+
+def attach_answered_questions(result, answered_questions, question_bank):
+    # Populates the relations ResultSerializer walks from the quiz's question
+    # bank, so a freshly created result can be rendered without being
+    # fetched back from the database. Falls back to a fetch if the bank
+    # lacks a question, e.g. one deleted while the attempt was running.
+    if question_bank is None or any(
+        aq.question_id not in question_bank.questions for aq in answered_questions
+    ):
+        return review_queryset().get(pk=result.id)
+
+    entries = [
+        AnsweredEntry(
+            id=aq.id,
+            question_id=aq.question_id,
+            question=question_bank.questions[aq.question_id],
+            selected_option_id=aq.selected_option_id,
+            selected_option=question_bank.options.get(aq.selected_option_id),
+            position_in_quiz=aq.position_in_quiz,
+        )
+        for aq in sorted(answered_questions, key=lambda aq: aq.position_in_quiz)
+    ]
+    result._prefetched_objects_cache = {"answered_questions": entries}
+
+    return result
+
+
+def attach_packed_answers(result, question_bank):
+    # Answers packed from rows keep their row's id; the rest never had one
+    # and take their position as their id. Answers whose question or option has since been
+    # deleted are dropped, as the cascade would have dropped their rows.
+    entries = []
+
+    if question_bank is not None:
+        for answer in sorted(
+            unpack_answers(result.answers), key=lambda answer: answer.position_in_quiz
+        ):
+            question = question_bank.questions.get(answer.question_id, None)
+            selected_option = question_bank.options.get(answer.selected_option_id, None)
+
+            if question is None or (
+                answer.selected_option_id is not None and selected_option is None
+            ):
+                continue
+
+            entries.append(
+                AnsweredEntry(
+                    id=(
+                        answer.id if answer.id is not None else answer.position_in_quiz
+                    ),
+                    question_id=answer.question_id,
+                    question=question,
+                    selected_option_id=answer.selected_option_id,
+                    selected_option=selected_option,
+                    position_in_quiz=answer.position_in_quiz,
+                )
+            )
+
+    result._prefetched_objects_cache = {"answered_questions": entries}
+
+    return result
+
+
+def store_review(result_id, data):
+    # Reviews are stored pre-encoded so retrieval can return them verbatim
+    document = JSONRenderer().render(data)
+    Result.objects.filter(pk=result_id).update(review=document)
+
+    return document
+
+
+def store_reviews(reviews):
+    # Bulk counterpart of store_review for (result, data) pairs, written in
+    # a single UPDATE
+    results, documents = [], []
+
+    for result, data in reviews:
+        document = JSONRenderer().render(data)
+        results.append(Result(pk=result.pk, review=document))
+        documents.append(document)
+
+    Result.objects.bulk_update(results, ["review"])
+
+    return documents
+
+
+def invalidate_reviews(**filters):
+    return Result.objects.filter(review__isnull=False, **filters).update(review=None)
@@ -0,0 +1,53 @@
+import random
+import logging
+import threading
+from array import array
+
+
+logger = logging.getLogger(__name__)
+
+
+class QuestionSampler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools = {}
+
+    def sample(self, question_bank, k):
+        # Pools follow the question bank's content version, so a bank built
+        # after a question write replaces the pool on the next draw.
+        quiz_id = question_bank.quiz_id
+        entry = self._pools.get(quiz_id)
+
+        if entry is None or entry[0] != question_bank.version:
+            # The pool is permuted in place, so it is a private copy of the
+            # bank's (immutable) id array.
+            entry = (question_bank.version, array("q", question_bank.question_ids))
+
+            with self._lock:
+                self._pools[quiz_id] = entry
+
+            logger.debug(
+                f"Question id pool loaded - Quiz ID: {quiz_id} - "
+                f"Size: {len(entry[1])}"
+            )
+
+        with self._lock:
+            pool = entry[1]
+            size = len(pool)
+            k = min(k, size)
+
+            # Partial Fisher-Yates shuffle: the first k slots of the pool end
+            # up holding a uniform random sample. The pool's order carries no
+            # meaning, so it is permuted in place instead of copied.
+            for i in range(k):
+                j = random.randrange(i, size)
+                pool[i], pool[j] = pool[j], pool[i]
+
+            return pool[:k].tolist()
+
+    def clear(self):
+        with self._lock:
+            self._pools.clear()
+
+
+question_sampler = QuestionSampler()
@@ -0,0 +1,16 @@
+def calculate_score(answer_key, answers):
+    # `answers` yields (question_id, selected_option_id) pairs, with a
+    # selected_option_id of None for skipped questions.
+    total_answered, total_correct = 0, 0
+
+    for question_id, selected_option_id in answers:
+        total_answered += 1
+
+        if selected_option_id and answer_key.get(question_id) == selected_option_id:
+            total_correct += 1
+
+    percentage_score = (
+        round((total_correct / total_answered) * 100, 1) if total_answered else 0
+    )
+
+    return total_answered, total_correct, percentage_score
@@ -0,0 +1,15 @@
+import random
+
+
+def new_seed():
+    return random.SystemRandom().getrandbits(31)
+
+
+def shuffle_options(options, seed, question_id):
+    # Options must arrive in a stable (primary key) order for a given seed
+    # to always reproduce the same permutation.
+    rng = random.Random(f"{seed}:{question_id}")
+    options = list(options)
+    rng.shuffle(options)
+
+    return options
@@ -0,0 +1,178 @@
+from collections import Counter, defaultdict
+
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Cast
+
+from ..models import QuizStats, QuizScoreBucket, QuestionStats
+from .answer_keys import answer_key_cache
+
+
+BUCKET_COUNT = 10
+
+
+def score_bucket(percentage_score):
+    return min(int(percentage_score // (100 / BUCKET_COUNT)), BUCKET_COUNT - 1)
+
+
+class StatsDelta:
+    # Counter increments accumulated from a set of results, applied with a
+    # few UPDATEs per quiz and one for all questions rather than per answer.
+    def __init__(self):
+        self.attempts = Counter()
+        self.percentage_totals = Counter()
+        self.buckets = Counter()
+        self.answers = Counter()
+        self.corrects = Counter()
+        self.question_quizzes = {}
+
+    def add(self, quiz_id, percentage_score, answers, answer_key):
+        # `answers` yields (question_id, selected_option_id) pairs
+        self.attempts[quiz_id] += 1
+        self.percentage_totals[quiz_id] += percentage_score
+        self.buckets[(quiz_id, score_bucket(percentage_score))] += 1
+
+        for question_id, selected_option_id in answers:
+            self.answers[question_id] += 1
+            self.question_quizzes[question_id] = quiz_id
+
+            if selected_option_id and answer_key.get(question_id) == selected_option_id:
+                self.corrects[question_id] += 1
+
+    def apply(self):
+        # Must run in the transaction that saves the results
+        self._apply_quizzes()
+        self._apply_questions()
+
+    def _apply_quizzes(self):
+        # Quizzes are locked in a fixed order so concurrent batches spanning
+        # several quizzes cannot deadlock
+        for quiz_id, attempts in sorted(self.attempts.items()):
+            updates = {
+                "attempt_count": F("attempt_count") + attempts,
+                "percentage_total": F("percentage_total")
+                + self.percentage_totals[quiz_id],
+            }
+
+            if not QuizStats.objects.filter(quiz_id=quiz_id).update(**updates):
+                ensure_quiz_stats([quiz_id])
+                QuizStats.objects.filter(quiz_id=quiz_id).update(**updates)
+
+        for (quiz_id, bucket), count in sorted(self.buckets.items()):
+            QuizScoreBucket.objects.filter(quiz_id=quiz_id, bucket=bucket).update(
+                count=F("count") + count
+            )
+
+    def _apply_questions(self):
+        if not self.answers:
+            return
+
+        # Counter rows are created before the single UPDATE, so rows created
+        # concurrently are incremented too rather than skipped
+        QuestionStats.objects.bulk_create(
+            [
+                QuestionStats(question_id=question_id, quiz_id=quiz_id)
+                for question_id, quiz_id in sorted(self.question_quizzes.items())
+            ],
+            ignore_conflicts=True,
+        )
+        self._update_questions(list(self.answers))
+
+    def _update_questions(self, question_ids):
+        # A single UPDATE, with the increments of each question picked by
+        # CASE, so concurrent writers lock rows in the same order
+        answer_increment = self._increment_case(self.answers, question_ids)
+        correct_increment = self._increment_case(self.corrects, question_ids)
+
+        return QuestionStats.objects.filter(pk__in=question_ids).update(
+            answer_count=F("answer_count") + answer_increment,
+            correct_count=F("correct_count") + correct_increment,
+            correct_rate=Cast(F("correct_count") + correct_increment, FloatField())
+            / (F("answer_count") + answer_increment),
+        )
+
+    def _increment_case(self, counter, question_ids):
+        groups = defaultdict(list)
+
+        for question_id in question_ids:
+            groups[counter[question_id]].append(question_id)
+
+        return Case(
+            *(
+                When(pk__in=ids, then=Value(increment))
+                for increment, ids in groups.items()
+            ),
+            default=Value(0),
+        )
+
+
+def ensure_quiz_stats(quiz_ids):
+    # Creates zeroed counters; rows created concurrently are left alone
+    QuizStats.objects.bulk_create(
+        [QuizStats(quiz_id=quiz_id) for quiz_id in quiz_ids], ignore_conflicts=True
+    )
+    QuizScoreBucket.objects.bulk_create(
+        [
+            QuizScoreBucket(quiz_id=quiz_id, bucket=bucket)
+            for quiz_id in quiz_ids
+            for bucket in range(BUCKET_COUNT)
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def record_results(submissions):
+    # Adds saved (result, answered questions) pairs to the counters
+    delta = StatsDelta()
+
+    for result, answered_questions in submissions:
+        delta.add(
+            result.quiz_id,
+            result.percentage_score,
+            ((aq.question_id, aq.selected_option_id) for aq in answered_questions),
+            answer_key_cache.get(result.quiz_id),
+        )
+
+    delta.apply()
+
+
+def read_quiz_stats(quiz_id, question_count=5):
+    stats = QuizStats.objects.filter(quiz_id=quiz_id).first()
+    attempt_count = stats.attempt_count if stats else 0
+    bucket_counts = dict(
+        QuizScoreBucket.objects.filter(quiz_id=quiz_id).values_list("bucket", "count")
+    )
+    bucket_width = 100 // BUCKET_COUNT
+
+    answered_questions = QuestionStats.objects.filter(
+        quiz_id=quiz_id, answer_count__gt=0
+    ).values("question_id", "question__content", "answer_count", "correct_rate")
+
+    def question_stats(ordering):
+        return [
+            {
+                "id": question["question_id"],
+                "content": question["question__content"],
+                "answer_count": question["answer_count"],
+                "correct_rate": round(question["correct_rate"], 3),
+            }
+            for question in answered_questions.order_by(ordering, "question_id")[
+                :question_count
+            ]
+        ]
+
+    return {
+        "attempt_count": attempt_count,
+        "average_score": (
+            round(stats.percentage_total / attempt_count, 1) if attempt_count else None
+        ),
+        "score_histogram": [
+            {
+                "min": bucket * bucket_width,
+                "max": bucket * bucket_width + bucket_width,
+                "count": bucket_counts.get(bucket, 0),
+            }
+            for bucket in range(BUCKET_COUNT)
+        ],
+        "hardest_questions": question_stats("correct_rate"),
+        "easiest_questions": question_stats("-correct_rate"),
+    }
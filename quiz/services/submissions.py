@@ -0,0 +1,108 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from ..models import Result, AnsweredQuestion
+from .answer_keys import answer_key_cache
+from .question_bank import question_bank_cache
+from .answers import pack_answers
+from .reviews import attach_answered_questions, attach_packed_answers
+from .scoring import calculate_score
+from .stats import record_results
+
+
+def read_submission(validated_data):
+    # Reduces a validated CreateResultSerializer payload to the arguments of
+    # build_result, which can be stored and built later
+    attempt = validated_data.get("attempt_token", None)
+    option_seed = validated_data.get("seed", None)
+    duration = None
+
+    if attempt:
+        option_seed = attempt.option_seed
+        duration = timezone.now() - attempt.started_at
+
+    return {
+        "answered_questions": [
+            {
+                "question_id": aq["question_id"],
+                "option_id": aq["option_id"],
+                "question_number": aq["question_number"],
+            }
+            for aq in validated_data["answered_questions"]
+        ],
+        "option_seed": option_seed,
+        "duration": duration,
+    }
+
+
+def build_result(quiz, answered_questions, option_seed=None, duration=None):
+    # Returns an unsaved result and its answered questions
+    total_answered, total_correct, percentage_score = calculate_score(
+        answer_key_cache.get(quiz.id),
+        ((aq["question_id"], aq["option_id"] or None) for aq in answered_questions),
+    )
+    result = Result(
+        quiz=quiz,
+        option_seed=option_seed,
+        duration=duration,
+        total_answered=total_answered,
+        total_correct=total_correct,
+        percentage_score=percentage_score,
+    )
+    answered_questions = [
+        AnsweredQuestion(
+            question_id=aq["question_id"],
+            selected_option_id=aq["option_id"] or None,
+            position_in_quiz=aq["question_number"],
+            result=result,
+        )
+        for aq in answered_questions
+    ]
+
+    return result, answered_questions
+
+
+def save_results(submissions):
+    # Inserts built results and all of their answered questions in one
+    # transaction, then attaches the answered questions' content so each
+    # result can be rendered without a re-fetch.
+    packed = settings.RESULT_ANSWER_STORAGE == "packed"
+
+    if packed:
+        for result, answered_questions in submissions:
+            result.answers = pack_answers(
+                (None, aq.question_id, aq.selected_option_id, aq.position_in_quiz)
+                for aq in answered_questions
+            )
+
+    with transaction.atomic():
+        results = [result for result, _ in submissions]
+
+        if connection.features.can_return_rows_from_bulk_insert:
+            Result.objects.bulk_create(results)
+        else:
+            # Primary keys of bulk inserted rows are needed to render the
+            # results but are not returned by every backend
+            for result in results:
+                result.save()
+
+        if not packed:
+            AnsweredQuestion.objects.bulk_create(
+                aq for _, answered_questions in submissions for aq in answered_questions
+            )
+
+        record_results(submissions)
+
+    if packed:
+        return [
+            attach_packed_answers(result, question_bank_cache.get(result.quiz_id))
+            for result in results
+        ]
+
+    return [
+        attach_answered_questions(
+            result, answered_questions, question_bank_cache.get(result.quiz_id)
+        )
+        for result, answered_questions in submissions
+    ]
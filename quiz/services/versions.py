@@ -0,0 +1,88 @@
+import time
+import threading
+from contextlib import contextmanager
+
+from django.core.cache import cache
+
+
+# Versions are microsecond timestamps rather than counters, so a version
+# minted after the cache loses a key can never repeat one handed out
+# before, and the version doubles as a Last-Modified time.
+CATALOGUE_VERSION_KEY = "quiz:version:catalogue"
+
+_pinned = threading.local()
+
+
+def quiz_version_key(quiz_id):
+    return f"quiz:version:{quiz_id}"
+
+
+def _new_version():
+    return time.time_ns() // 1000
+
+
+@contextmanager
+def pinned_versions():
+    # Within the block each version is read from the shared cache once, so
+    # the several cache lookups of a request cost one round trip per quiz
+    # and all see the same content version
+    if getattr(_pinned, "versions", None) is not None:
+        yield
+        return
+
+    _pinned.versions = {}
+
+    try:
+        yield
+    finally:
+        _pinned.versions = None
+
+
+def _get_version(key):
+    versions = getattr(_pinned, "versions", None)
+
+    if versions is not None and key in versions:
+        return versions[key]
+
+    version = cache.get(key)
+
+    if version is None:
+        version = _new_version()
+
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+
+    if versions is not None:
+        versions[key] = version
+
+    return version
+
+
+def _set_version(key):
+    version = _new_version()
+    cache.set(key, version, timeout=None)
+
+    versions = getattr(_pinned, "versions", None)
+
+    if versions is not None:
+        versions[key] = version
+
+
+def get_catalogue_version():
+    return _get_version(CATALOGUE_VERSION_KEY)
+
+
+def get_quiz_version(quiz_id):
+    return _get_version(quiz_version_key(quiz_id))
+
+
+def bump_catalogue_version():
+    _set_version(CATALOGUE_VERSION_KEY)
+
+
+def bump_quiz_version(quiz_id):
+    _set_version(quiz_version_key(quiz_id))
+
+
+def version_timestamp(version):
+    return version // 1_000_000
@@ -0,0 +1,178 @@
+import time
+import logging
+import threading
+from datetime import timedelta
+
+from django.db import DatabaseError, close_old_connections, transaction
+from django.utils import timezone
+
+from ..models import PendingResult
+from ..serializers import ResultSerializer
+from .question_bank import question_bank_cache
+from .reviews import store_reviews
+from .submissions import build_result, save_results
+from .versions import pinned_versions
+
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_result(quiz, submission):
+    # Queues a submission from read_submission and returns its ticket
+    pending_result = PendingResult.objects.create(quiz=quiz, **submission)
+    result_flusher.notify()
+
+    return pending_result
+
+
+def _save_pending(pending_results):
+    submissions = [
+        build_result(
+            pending_result.quiz,
+            pending_result.answered_questions,
+            option_seed=pending_result.option_seed,
+            duration=pending_result.duration,
+        )
+        for pending_result in pending_results
+    ]
+    results = save_results(submissions)
+
+    for pending_result, result in zip(pending_results, results):
+        pending_result.result = result
+
+    PendingResult.objects.bulk_update(pending_results, ["result"])
+    store_reviews((result, ResultSerializer(result).data) for result in results)
+
+    return results
+
+
+def flush_pending_results(batch_size=200):
+    # Writes one batch of queued submissions and returns the written results.
+    # Rows are claimed with SKIP LOCKED where the backend supports it, so
+    # flushers in several workers never write the same submission twice.
+    with pinned_versions(), transaction.atomic():
+        pending_results = list(
+            PendingResult.objects.filter(result__isnull=True, failed=False)
+            .select_related("quiz")
+            .select_for_update(skip_locked=True, of=("self",))
+            .order_by("id")[:batch_size]
+        )
+
+        if not pending_results:
+            return []
+
+        # Submissions are validated when queued, but their questions or
+        # options can be deleted before they are written
+        writable, unwritable = [], []
+
+        for pending_result in pending_results:
+            question_bank = question_bank_cache.get(pending_result.quiz_id)
+            is_writable = question_bank is not None and all(
+                (
+                    question_bank.has_option(aq["question_id"], aq["option_id"])
+                    if aq["option_id"]
+                    else aq["question_id"] in question_bank.questions
+                )
+                for aq in pending_result.answered_questions
+            )
+            (writable if is_writable else unwritable).append(pending_result)
+
+        if not writable:
+            _fail_pending(unwritable)
+            return []
+
+        try:
+            with transaction.atomic():
+                results = _save_pending(writable)
+        except DatabaseError:
+            # One bad row must not hold back the batch, so the rows are
+            # retried one by one and the ones that fail again are dropped
+            logger.warning("Pending result batch failed, writing one by one")
+            results = []
+
+            for pending_result in writable:
+                try:
+                    with transaction.atomic():
+                        results.extend(_save_pending([pending_result]))
+                except DatabaseError:
+                    logger.error(
+                        f"Pending result write failed - Ticket: {pending_result.id}",
+                        exc_info=True,
+                    )
+                    unwritable.append(pending_result)
+
+        _fail_pending(unwritable)
+
+        return results
+
+
+def _fail_pending(pending_results):
+    if not pending_results:
+        return
+
+    logger.warning(
+        f"Unwritable pending results dropped - "
+        f"Tickets: {[pending_result.id for pending_result in pending_results]}"
+    )
+    PendingResult.objects.filter(
+        pk__in=[pending_result.id for pending_result in pending_results]
+    ).update(failed=True)
+
+
+def prune_pending_results(retention):
+    # Deletes tickets whose outcome is older than `retention`
+    return (
+        PendingResult.objects.filter(created_at__lt=timezone.now() - retention)
+        .exclude(result__isnull=True, failed=False)
+        .delete()[0]
+    )
+
+
+class ResultFlusher:
+    # Background thread that writes queued submissions. Each web worker runs
+    # its own; queued rows live in the database, so whatever a worker leaves
+    # behind is picked up by the next flusher or the `flush_results` command.
+    FLUSH_DELAY = 0.2  # seconds, lets concurrent submissions share a batch
+    IDLE_INTERVAL = 30  # seconds between checks for rows left by other workers
+    BATCH_SIZE = 200
+    TICKET_RETENTION = timedelta(days=1)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def notify(self):
+        self.start()
+        self._wakeup.set()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="result-flusher", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        logger.info("Result flusher started")
+
+        while True:
+            idle = not self._wakeup.wait(self.IDLE_INTERVAL)
+
+            time.sleep(self.FLUSH_DELAY)
+            self._wakeup.clear()
+
+            try:
+                close_old_connections()
+
+                while len(flush_pending_results(self.BATCH_SIZE)) == self.BATCH_SIZE:
+                    pass
+
+                if idle:
+                    prune_pending_results(self.TICKET_RETENTION)
+            except Exception:
+                logger.exception("Result flush failed")
+
+
+result_flusher = ResultFlusher()
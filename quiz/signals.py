@@ -0,0 +1,93 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from .models import Quiz, Question, Option
+from .services.reviews import invalidate_reviews
+from .services.versions import bump_catalogue_version, bump_quiz_version
+
+
+def is_cascade(origin, model):
+    # `origin` is the instance or queryset whose delete() was called
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return origin_model is not model
+
+
+@receiver(post_save, sender=Quiz)
+def invalidate_quiz_reviews(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_reviews(quiz_id=instance.id)
+
+
+def invalidate_answered_reviews(question_id, quiz_id):
+    invalidate_reviews(answered_questions__question_id=question_id)
+    # Packed answers cannot be filtered by question
+    invalidate_reviews(quiz_id=quiz_id, answers__isnull=False)
+
+
+@receiver(post_save, sender=Question)
+def invalidate_question_reviews(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_answered_reviews(instance.id, instance.quiz_id)
+
+
+@receiver(post_save, sender=Option)
+def invalidate_option_reviews(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_answered_reviews(instance.question_id, instance.question.quiz_id)
+
+
+# Deletions invalidate before the cascade removes the AnsweredQuestion rows
+# that tell which results answered the question. Results of deleted quizzes
+# go with them, and options deleted with their question are covered by it.
+@receiver(pre_delete, sender=Question)
+def invalidate_deleted_question_reviews(sender, instance, origin, **kwargs):
+    if not is_cascade(origin, Question):
+        invalidate_answered_reviews(instance.id, instance.quiz_id)
+
+
+@receiver(pre_delete, sender=Option)
+def invalidate_deleted_option_reviews(sender, instance, origin, **kwargs):
+    if not is_cascade(origin, Option):
+        invalidate_answered_reviews(instance.question_id, instance.question.quiz_id)
+
+
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Quiz)
+def bump_quiz_versions(sender, instance, **kwargs):
+    transaction.on_commit(partial(bump_quiz_version, instance.id))
+    transaction.on_commit(bump_catalogue_version)
+
+
+@receiver(post_save, sender=Question)
+def bump_question_quiz_version(sender, instance, **kwargs):
+    transaction.on_commit(partial(bump_quiz_version, instance.quiz_id))
+
+
+@receiver(post_delete, sender=Question)
+def bump_question_quiz_version_on_delete(sender, instance, origin, **kwargs):
+    # Versions of cascade-deleted quizzes are bumped by their own handler
+    if not is_cascade(origin, Question):
+        transaction.on_commit(partial(bump_quiz_version, instance.quiz_id))
+
+
+@receiver(post_save, sender=Option)
+def bump_option_quiz_version(sender, instance, **kwargs):
+    transaction.on_commit(partial(bump_quiz_version, instance.question.quiz_id))
+
+
+@receiver(post_delete, sender=Option)
+def bump_option_quiz_version_on_delete(sender, instance, origin, **kwargs):
+    if is_cascade(origin, Option):
+        return
+
+    quiz_id = (
+        Question.objects.filter(pk=instance.question_id)
+        .values_list("quiz_id", flat=True)
+        .first()
+    )
+    if quiz_id is not None:
+        transaction.on_commit(partial(bump_quiz_version, quiz_id))
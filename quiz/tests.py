@@ -1,3 +1,1044 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+from io import StringIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from .management.commands.seed_db import Command as SeedDbCommand
+from .models import (
+    HarvestCheckpoint,
+    IdempotencyKey,
+    Quiz,
+    Question,
+    Option,
+    Result,
+    AnsweredQuestion,
+    PendingResult,
+    QuizStats,
+    QuizScoreBucket,
+    QuestionStats,
+)
+from .renderers import EncodedQuestionList
+from .services.answer_keys import answer_key_cache
+from .services.attempts import ATTEMPT_TOKEN_MAX_AGE, mint_attempt_token
+from .services.content_hash import content_hash
+from .services.idempotency import IdempotencyStore, idempotency_store
+from .services.opentdb_client import APIClientError, OpenTDBClient
+from .services.question_bank import question_bank_cache
+from .services.submissions import save_results
+from .services.versions import quiz_version_key
+from .services.write_behind import flush_pending_results
+from .serializers import (
+    QuestionSerializer,
+    QuizSerializer,
+    QuizValuesSerializer,
+    ResultSerializer,
+    ResultValuesSerializer,
+)
+
+
+def serialize_values(serializer_class, queryset, context, many=False):
+    lookups = serializer_class(context=context).lookups
+    rows = queryset.values(*lookups)
+
+    if many:
+        return serializer_class(rows, many=True, context=context).data
+
+    return serializer_class(rows.get(), context=context).data
+
+
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class LocalCacheTestCase(TestCase):
+    # Keeps tests off the development server's cache
+    def setUp(self):
+        # Quiz ids and versions repeat across test databases
+        cache.clear()
+        question_bank_cache.clear()
+        answer_key_cache.clear()
+
+
+class QuizValuesSerializerTests(LocalCacheTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Quiz.objects.create(title="Plain", questions_per_attempt=10)
+        Quiz.objects.create(
+            title="Illustrated",
+            description="With a cover image",
+            cover_image="images/cover.png",
+        )
+
+    def assertEquivalent(self, context):
+        queryset = Quiz.objects.order_by("id")
+
+        self.assertEqual(
+            serialize_values(QuizValuesSerializer, queryset, context, many=True),
+            QuizSerializer(queryset, many=True, context=context).data,
+        )
+
+    def test_matches_model_serializer(self):
+        self.assertEquivalent({})
+
+    def test_matches_model_serializer_with_request(self):
+        self.assertEquivalent({"request": APIRequestFactory().get("/quiz/quizzes/")})
+
+    def test_matches_model_serializer_with_requested_fields(self):
+        self.assertEquivalent({"fields": ["id", "title"]})
+        self.assertEquivalent({"fields": ["cover_image", "question_count"]})
+
+
+class ResultValuesSerializerTests(LocalCacheTestCase):
+    SUMMARY_FIELDS = [
+        "id",
+        "quiz",
+        "total_answered",
+        "total_correct",
+        "percentage_score",
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.quiz = Quiz.objects.create(title="Quiz")
+        questions = [
+            Question.objects.create(quiz=cls.quiz, content=f"Q{i}") for i in range(3)
+        ]
+        answers = []
+
+        for question in questions:
+            correct, wrong = Option.objects.bulk_create(
+                [
+                    Option(question=question, content="Right", is_correct=True),
+                    Option(question=question, content="Wrong", is_correct=False),
+                ]
+            )
+            answers.append((question, correct if question is questions[0] else wrong))
+
+        cls.scored = Result.objects.create(
+            quiz=cls.quiz, total_answered=3, total_correct=1, percentage_score=33.3
+        )
+        cls.legacy = Result.objects.create(quiz=cls.quiz)
+        AnsweredQuestion.objects.bulk_create(
+            AnsweredQuestion(
+                result=cls.legacy,
+                question=question,
+                selected_option=option,
+                position_in_quiz=position,
+            )
+            for position, (question, option) in enumerate(answers, start=1)
+        )
+
+    def assertEquivalent(self, result, fields):
+        context = {"fields": fields}
+        queryset = Result.objects.filter(pk=result.pk)
+
+        self.assertEqual(
+            serialize_values(ResultValuesSerializer, queryset, context),
+            ResultSerializer(queryset.get(), context=context).data,
+        )
+
+    def test_matches_model_serializer(self):
+        self.assertEquivalent(self.scored, self.SUMMARY_FIELDS)
+
+    def test_matches_model_serializer_for_unscored_results(self):
+        self.assertEquivalent(self.legacy, self.SUMMARY_FIELDS)
+
+    def test_matches_model_serializer_with_requested_fields(self):
+        self.assertEquivalent(self.scored, ["quiz", "total_correct"])
+        self.assertEquivalent(self.legacy, ["id", "percentage_score"])
+
+
+class QuizConditionalGetTests(LocalCacheTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.quiz = Quiz.objects.create(title="Quiz")
+
+    def retrieve(self, pk=None, **headers):
+        return self.client.get(
+            reverse("quiz-detail", kwargs={"pk": pk or self.quiz.id}), **headers
+        )
+
+    def test_serves_validators(self):
+        response = self.retrieve()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header("ETag"))
+        self.assertTrue(response.has_header("Last-Modified"))
+
+    def test_matching_etag_is_not_modified_without_queries(self):
+        etag = self.retrieve()["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.retrieve(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_changed_quiz_is_served_again(self):
+        first = self.retrieve()
+        self.quiz.title = "Renamed"
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.quiz.save()
+
+        response = self.retrieve(
+            HTTP_IF_NONE_MATCH=first["ETag"],
+            HTTP_IF_MODIFIED_SINCE=first["Last-Modified"],
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["title"], "Renamed")
+        self.assertNotEqual(response["ETag"], first["ETag"])
+
+    def test_missing_quiz_is_never_not_modified(self):
+        response = self.retrieve(
+            self.quiz.id + 1,
+            HTTP_IF_MODIFIED_SINCE="Fri, 01 Jan 2100 00:00:00 GMT",
+        )
+
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header("ETag"))
+
+
+class EncodedQuestionListTests(LocalCacheTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.quiz = Quiz.objects.create(title="Quiz", questions_per_attempt=3)
+        contents = {
+            'Où est "l\'église"?': ["Là-bas", 'Ici, "près"', "Nulle part ✓", "\\"],
+            "Without options": [],
+            "Plain": ["One", "Two"],
+        }
+
+        for content, options in contents.items():
+            question = Question.objects.create(quiz=cls.quiz, content=content)
+            Option.objects.bulk_create(
+                Option(question=question, content=option, is_correct=i == 0)
+                for i, option in enumerate(options)
+            )
+
+    def test_matches_serializer_output(self):
+        question_bank = question_bank_cache.get(self.quiz.id)
+        questions = list(question_bank.questions.values())
+
+        for option_seed in (0, 1, 2**31 - 1):
+            context = {"option_seed": option_seed}
+            encoded = EncodedQuestionList(question_bank, questions, context)
+
+            self.assertEqual(
+                encoded.encode(),
+                JSONRenderer().render(
+                    QuestionSerializer(questions, many=True, context=context).data
+                ),
+            )
+
+    def test_serves_serializer_output(self):
+        response = self.client.get(
+            reverse("question-list", kwargs={"quiz_pk": self.quiz.id})
+        )
+        question_bank = question_bank_cache.get(self.quiz.id)
+        questions = [
+            question_bank.questions[question["id"]] for question in response.json()
+        ]
+        context = {"option_seed": int(response["X-Attempt-Seed"])}
+
+        self.assertEqual(
+            response.content,
+            JSONRenderer().render(
+                QuestionSerializer(questions, many=True, context=context).data
+            ),
+        )
+
+
+class QuizFixtureTestCase(LocalCacheTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.quiz = Quiz.objects.create(title="Quiz", questions_per_attempt=2)
+        cls.answers = []
+
+        for i in range(3):
+            question = Question.objects.create(quiz=cls.quiz, content=f"Q{i}")
+            correct, _ = Option.objects.bulk_create(
+                [
+                    Option(question=question, content="Right", is_correct=True),
+                    Option(question=question, content="Wrong", is_correct=False),
+                ]
+            )
+            cls.answers.append((question.id, correct.id))
+
+    def answer(self, index, question_number):
+        question_id, option_id = self.answers[index]
+        return {
+            "question_id": question_id,
+            "option_id": option_id,
+            "question_number": question_number,
+        }
+
+    def submit(self, answered_questions, quiz=None, data=None, **headers):
+        return self.client.post(
+            reverse("result-list", kwargs={"quiz_pk": (quiz or self.quiz).id}),
+            {"answered_questions": answered_questions, **(data or {})},
+            content_type="application/json",
+            **headers,
+        )
+
+
+class ResultCreateTests(QuizFixtureTestCase):
+    def test_creates_scored_result(self):
+        response = self.submit([self.answer(0, 1), self.answer(1, 2)])
+
+        self.assertEqual(response.status_code, 201)
+        result = Result.objects.get()
+        self.assertEqual((result.total_answered, result.total_correct), (2, 2))
+
+    def test_reads_quiz_version_once(self):
+        self.submit([self.answer(0, 1)])
+        get = cache.get
+
+        with mock.patch.object(cache, "get", side_effect=get) as cache_get:
+            response = self.submit([self.answer(0, 1), self.answer(1, 2)])
+
+        self.assertEqual(response.status_code, 201)
+        version_reads = [
+            call
+            for call in cache_get.call_args_list
+            if call.args[0] == quiz_version_key(self.quiz.id)
+        ]
+        self.assertEqual(len(version_reads), 1)
+
+    def test_rejects_repeated_questions(self):
+        response = self.submit([self.answer(0, number) for number in range(1, 11)])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("question_id", response.json()["answered_questions"])
+        self.assertFalse(Result.objects.exists())
+
+    def test_rejects_out_of_range_question_numbers(self):
+        for question_number in (0, -1, 32768):
+            response = self.submit([self.answer(0, question_number)])
+
+            self.assertEqual(response.status_code, 400)
+
+        self.assertFalse(Result.objects.exists())
+
+
+class AttemptTokenTests(QuizFixtureTestCase):
+    def mint(self, question_count=2, quiz=None, option_seed=1234, age=0):
+        with mock.patch(
+            "quiz.services.attempts.time.time", return_value=time.time() - age
+        ):
+            return mint_attempt_token(
+                quiz_id=(quiz or self.quiz).id,
+                question_ids=[question_id for question_id, _ in self.answers][
+                    :question_count
+                ],
+                option_seed=option_seed,
+            )
+
+    def submit_attempt(self, attempt_token, answered_questions=None):
+        return self.submit(
+            answered_questions or [self.answer(0, 1), self.answer(1, 2)],
+            data={"attempt_token": attempt_token, "seed": 5},
+        )
+
+    def assertRejected(self, response, field, message=None):
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(field, response.json())
+
+        if message is not None:
+            self.assertEqual(response.json()[field], [message])
+
+        self.assertFalse(Result.objects.exists())
+
+    def test_takes_seed_and_duration_from_token(self):
+        response = self.submit_attempt(self.mint(age=90))
+
+        self.assertEqual(response.status_code, 201)
+        result = Result.objects.get()
+        self.assertEqual(result.option_seed, 1234)
+        self.assertGreaterEqual(result.duration, timedelta(seconds=90))
+        self.assertLess(result.duration, timedelta(seconds=120))
+
+    def test_rejects_tampered_token(self):
+        token = self.mint()
+        tampered = token[:-1] + ("A" if token[-1] != "A" else "B")
+
+        self.assertRejected(
+            self.submit_attempt(tampered), "attempt_token", "Invalid attempt token"
+        )
+
+    def test_rejects_expired_token(self):
+        token = self.mint(age=ATTEMPT_TOKEN_MAX_AGE + 60)
+
+        self.assertRejected(
+            self.submit_attempt(token), "attempt_token", "Attempt token has expired"
+        )
+
+    def test_rejects_token_of_another_quiz(self):
+        other = Quiz.objects.create(title="Other")
+
+        self.assertRejected(self.submit_attempt(self.mint(quiz=other)), "attempt_token")
+
+    def test_rejects_questions_not_issued(self):
+        response = self.submit_attempt(self.mint(question_count=1))
+
+        self.assertRejected(response, "answered_questions")
+        self.assertIn("question_id", response.json()["answered_questions"])
+
+
+class IdempotencyTests(QuizFixtureTestCase):
+    def claim(self, key, age):
+        return IdempotencyKey.objects.create(
+            key=key, fingerprint="0" * 64, created_at=timezone.now() - age
+        )
+
+    def test_replays_completed_request(self):
+        first = self.submit([self.answer(0, 1)], HTTP_IDEMPOTENCY_KEY="key")
+        second = self.submit([self.answer(0, 1)], HTTP_IDEMPOTENCY_KEY="key")
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertFalse(first.has_header("Idempotent-Replayed"))
+        self.assertEqual(Result.objects.count(), 1)
+
+    def test_rejects_reused_key_with_different_body(self):
+        self.submit([self.answer(0, 1)], HTTP_IDEMPOTENCY_KEY="key")
+        response = self.submit([self.answer(1, 1)], HTTP_IDEMPOTENCY_KEY="key")
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Result.objects.count(), 1)
+
+    def test_takes_over_stale_claim(self):
+        self.claim("key", IdempotencyStore.LOCK_TIMEOUT + timedelta(seconds=1))
+
+        response = self.submit([self.answer(0, 1)], HTTP_IDEMPOTENCY_KEY="key")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(IdempotencyKey.objects.get(key="key").status_code, 201)
+
+    def test_completing_lost_claim_keeps_takeover(self):
+        record, claimed = idempotency_store.claim("key", "0" * 64)
+        self.assertTrue(claimed)
+        IdempotencyKey.objects.filter(pk=record.pk).delete()
+        takeover, _ = idempotency_store.claim("key", "0" * 64)
+
+        idempotency_store.complete(record, 201, {}, b"{}")
+
+        takeover.refresh_from_db()
+        self.assertIsNone(takeover.status_code)
+
+    @mock.patch.object(IdempotencyStore, "LOCK_WAIT", 0.1)
+    def test_conflicts_with_running_request(self):
+        self.claim("key", timedelta())
+
+        response = self.submit([self.answer(0, 1)], HTTP_IDEMPOTENCY_KEY="key")
+
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Result.objects.exists())
+
+    @mock.patch.object(IdempotencyStore, "LOCK_WAIT", 0.1)
+    def test_unrelated_integrity_error_waits_out_deadline(self):
+        with (
+            mock.patch.object(
+                IdempotencyKey.objects, "create", side_effect=IntegrityError
+            ) as create,
+            mock.patch("quiz.services.idempotency.time.sleep") as sleep,
+        ):
+            self.assertEqual(idempotency_store.claim("key", "0" * 64), (None, False))
+
+        self.assertTrue(sleep.called)
+        self.assertEqual(create.call_count, sleep.call_count + 1)
+
+
+class ResultBatchTests(QuizFixtureTestCase):
+    def submit_batch(self, items):
+        return self.client.post(
+            reverse("result-batch"), {"results": items}, content_type="application/json"
+        )
+
+    def item(self, quiz, seed=0):
+        return {"quiz": quiz, "seed": seed, "answered_questions": [self.answer(0, 1)]}
+
+    def statuses(self, response):
+        return [outcome["status"] for outcome in response.json()["results"]]
+
+    def test_validates_quiz_ids(self):
+        response = self.submit_batch(
+            [
+                self.item(self.quiz.id),
+                self.item(True),
+                self.item(str(self.quiz.id)),
+                self.item(self.quiz.id + 1),
+                {"answered_questions": [self.answer(0, 1)]},
+            ]
+        )
+
+        self.assertEqual(self.statuses(response), [201, 400, 201, 404, 400])
+        self.assertEqual(Result.objects.count(), 2)
+
+    def test_rejected_item_does_not_fail_batch(self):
+        def save_or_reject(submissions):
+            if any(result.option_seed == 13 for result, _ in submissions):
+                raise IntegrityError("rejected")
+
+            return save_results(submissions)
+
+        with mock.patch("quiz.views.save_results", save_or_reject):
+            response = self.submit_batch(
+                [self.item(self.quiz.id), self.item(self.quiz.id, seed=13)]
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.statuses(response), [201, 400])
+        self.assertEqual(Result.objects.count(), 1)
+
+
+class ReviewInvalidationTests(QuizFixtureTestCase):
+    def create_result(self):
+        response = self.submit([self.answer(0, 1), self.answer(1, 2)])
+        result = Result.objects.get(pk=response.json()["id"])
+        self.assertIsNotNone(result.review)
+
+        return result
+
+    def assertReviewInvalidated(self, result):
+        result.refresh_from_db()
+        self.assertIsNone(result.review)
+
+    def test_question_delete_invalidates_reviews(self):
+        result = self.create_result()
+        Question.objects.get(pk=self.answers[0][0]).delete()
+
+        self.assertReviewInvalidated(result)
+        self.assertEqual(result.answered_questions.count(), 1)
+
+    def test_option_delete_invalidates_reviews(self):
+        result = self.create_result()
+        Option.objects.filter(question_id=self.answers[1][0], is_correct=False).delete()
+
+        self.assertReviewInvalidated(result)
+
+    @override_settings(RESULT_ANSWER_STORAGE="packed")
+    def test_question_delete_invalidates_packed_reviews(self):
+        result = self.create_result()
+        self.assertIsNotNone(result.answers)
+        Question.objects.get(pk=self.answers[0][0]).delete()
+
+        self.assertReviewInvalidated(result)
+
+
+class PackAnswersTests(QuizFixtureTestCase):
+    def convert(self, *args):
+        call_command("pack_answers", *args, stdout=StringIO())
+        call_command("rebuild_reviews", "--all", stdout=StringIO())
+
+    def reviews(self):
+        return {
+            result_id: bytes(review)
+            for result_id, review in Result.objects.values_list("id", "review")
+        }
+
+    def test_round_trip_keeps_reviews(self):
+        for answered_questions in [
+            [self.answer(0, 1), self.answer(1, 2)],
+            [self.answer(2, 1), {**self.answer(0, 2), "option_id": 0}],
+        ]:
+            self.assertEqual(self.submit(answered_questions).status_code, 201)
+
+        reviews = self.reviews()
+        answered_question_ids = set(AnsweredQuestion.objects.values_list("id"))
+
+        self.convert()
+        self.assertFalse(AnsweredQuestion.objects.exists())
+        self.assertEqual(self.reviews(), reviews)
+
+        self.convert("--unpack")
+        self.assertEqual(self.reviews(), reviews)
+        self.assertEqual(
+            set(AnsweredQuestion.objects.values_list("id")), answered_question_ids
+        )
+
+    @override_settings(RESULT_ANSWER_STORAGE="packed")
+    def test_unpack_invalidates_reviews_of_results_written_packed(self):
+        response = self.submit([self.answer(0, 1), self.answer(1, 2)])
+        self.assertEqual(
+            [aq["id"] for aq in response.json()["answered_questions"]], [1, 2]
+        )
+
+        call_command("pack_answers", "--unpack", stdout=StringIO())
+
+        self.assertIsNone(Result.objects.get().review)
+
+
+class QuizStatsTests(QuizFixtureTestCase):
+    def wrong_answer(self, index, question_number):
+        answer = self.answer(index, question_number)
+        answer["option_id"] = Option.objects.get(
+            question_id=answer["question_id"], is_correct=False
+        ).id
+
+        return answer
+
+    def submit_attempts(self):
+        for answered_questions in [
+            [self.answer(0, 1), self.answer(1, 2)],
+            [self.answer(0, 1), self.wrong_answer(1, 2)],
+            [self.wrong_answer(0, 1), self.wrong_answer(2, 2)],
+        ]:
+            self.assertEqual(self.submit(answered_questions).status_code, 201)
+
+    def snapshot(self):
+        stats = QuizStats.objects.get(quiz=self.quiz)
+
+        return (
+            stats.attempt_count,
+            stats.percentage_total,
+            dict(
+                QuizScoreBucket.objects.filter(quiz=self.quiz, count__gt=0).values_list(
+                    "bucket", "count"
+                )
+            ),
+            set(
+                QuestionStats.objects.values_list(
+                    "question_id", "answer_count", "correct_count", "correct_rate"
+                )
+            ),
+        )
+
+    def test_counts_saved_results(self):
+        self.submit_attempts()
+        question_ids = [question_id for question_id, _ in self.answers]
+
+        self.assertEqual(
+            self.snapshot(),
+            (
+                3,
+                150,
+                {0: 1, 5: 1, 9: 1},
+                {
+                    (question_ids[0], 3, 2, 2 / 3),
+                    (question_ids[1], 2, 1, 0.5),
+                    (question_ids[2], 1, 0, 0.0),
+                },
+            ),
+        )
+
+    def test_serves_stats(self):
+        self.submit_attempts()
+
+        response = self.client.get(reverse("quiz-stats", kwargs={"pk": self.quiz.id}))
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data["attempt_count"], data["average_score"]), (3, 50.0))
+        self.assertEqual(
+            [bucket["count"] for bucket in data["score_histogram"]],
+            [1, 0, 0, 0, 0, 1, 0, 0, 0, 1],
+        )
+        self.assertEqual(
+            [question["id"] for question in data["hardest_questions"]],
+            [question_id for question_id, _ in reversed(self.answers)],
+        )
+
+    def test_rebuild_matches_counters(self):
+        self.submit_attempts()
+
+        with override_settings(RESULT_ANSWER_STORAGE="packed"):
+            response = self.submit([self.answer(1, 1), self.wrong_answer(2, 2)])
+
+        self.assertEqual(response.status_code, 201)
+
+        counted = self.snapshot()
+        QuizStats.objects.update(attempt_count=0, percentage_total=0)
+        QuizScoreBucket.objects.update(count=0)
+        QuestionStats.objects.all().delete()
+
+        call_command("rebuild_stats", "--chunk-size", "2", stdout=StringIO())
+
+        self.assertEqual(self.snapshot(), counted)
+
+
+class FlushPendingResultsTests(QuizFixtureTestCase):
+    def enqueue(self, *answered_questions):
+        return PendingResult.objects.create(
+            quiz=self.quiz, answered_questions=list(answered_questions)
+        )
+
+    def test_writes_queued_results(self):
+        tickets = [self.enqueue(self.answer(0, 1)), self.enqueue(self.answer(1, 1))]
+
+        self.assertEqual(len(flush_pending_results()), 2)
+
+        for ticket in tickets:
+            ticket.refresh_from_db()
+            self.assertIsNotNone(ticket.result_id)
+
+    def test_failing_row_does_not_block_batch(self):
+        # Queued before question numbers were range checked
+        bad = self.enqueue(self.answer(0, -1))
+        good = self.enqueue(self.answer(1, 1))
+
+        self.assertEqual(len(flush_pending_results()), 1)
+
+        bad.refresh_from_db()
+        good.refresh_from_db()
+        self.assertTrue(bad.failed)
+        self.assertIsNone(bad.result_id)
+        self.assertIsNotNone(good.result_id)
+        self.assertEqual(flush_pending_results(), [])
+
+
+class StubOpenTDBHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in one segment, avoiding delayed ACK stalls
+    wbufsize = 64 * 1024
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.path, self.client_address))
+
+        if server.responses:
+            status, body = server.responses.pop(0)
+        elif server.opentdb is not None:
+            status, body = 200, server.opentdb.respond(self.path)
+        else:
+            status, body = 200, {}
+
+        payload = json.dumps(body).encode()
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubOpenTDB:
+    # Serves categories of numbered questions, paged per session token like
+    # OpenTDB
+    def __init__(self, categories):
+        # `categories` maps category ids to (name, question count)
+        self.categories = categories
+        # Question counts reported instead of the real ones, by category id
+        self.reported_counts = {}
+        self.served = {}
+        self.token_count = 0
+
+    def question(self, category_id, index):
+        return {
+            "question": f"Question {index} of category {category_id}",
+            "correct_answer": "Right",
+            "incorrect_answers": ["Wrong"],
+        }
+
+    def respond(self, url):
+        parsed = urlsplit(url)
+        params = dict(parse_qsl(parsed.query))
+
+        if parsed.path == "/api_count_global.php":
+            return {
+                "categories": {
+                    str(category_id): {
+                        "total_num_of_verified_questions": self.reported_counts.get(
+                            category_id, count
+                        )
+                    }
+                    for category_id, (_, count) in self.categories.items()
+                }
+            }
+
+        if parsed.path == "/api_category.php":
+            return {
+                "trivia_categories": [
+                    {"id": category_id, "name": name}
+                    for category_id, (name, _) in self.categories.items()
+                ]
+            }
+
+        if parsed.path == "/api_token.php":
+            self.token_count += 1
+            return {"response_code": 0, "token": f"token-{self.token_count}"}
+
+        category_id, amount = int(params["category"]), int(params["amount"])
+        key = (params["token"], category_id)
+        served = self.served.get(key, 0)
+        left = self.categories[category_id][1] - served
+
+        if left == 0:
+            return {"response_code": 4, "results": []}
+
+        if amount > left:
+            return {"response_code": 1, "results": []}
+
+        self.served[key] = served + amount
+
+        return {
+            "response_code": 0,
+            "results": [
+                self.question(category_id, index)
+                for index in range(served, served + amount)
+            ],
+        }
+
+
+def start_stub_server(test_case, opentdb=None):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOpenTDBHandler)
+    server.requests = []
+    server.responses = []
+    server.opentdb = opentdb
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+    )
+    thread.start()
+
+    test_case.addCleanup(server.server_close)
+    test_case.addCleanup(server.shutdown)
+
+    return server
+
+
+class StubOpenTDBClient(OpenTDBClient):
+    RATE_INTERVAL = 0.001
+    BACKOFF_BASE = 0.01
+    BACKOFF_MAX = 0.03
+
+
+class OpenTDBClientTests(SimpleTestCase):
+    def setUp(self):
+        self.server = start_stub_server(self)
+        self.client = StubOpenTDBClient(
+            base_url=f"http://127.0.0.1:{self.server.server_port}"
+        )
+        self.addCleanup(self.client.close)
+
+    def respond(self, *responses):
+        self.server.responses.extend(responses)
+
+    def test_success_code_returns_result(self):
+        self.respond((200, {"response_code": 0, "token": "abc"}))
+        self.client.set_token()
+
+        self.assertEqual(self.client.session_token, "abc")
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_connection_is_reused(self):
+        self.respond(*[(200, {"response_code": 0, "results": []})] * 3)
+
+        for _ in range(3):
+            self.client.get_questions_for_category(9, 10)
+
+        clients = {client_address for _, client_address in self.server.requests}
+        self.assertEqual(len(clients), 1)
+
+    def test_server_errors_are_retried(self):
+        self.respond((503, {}), (500, {}), (200, {"response_code": 0, "token": "x"}))
+        self.client.set_token()
+
+        self.assertEqual(self.client.session_token, "x")
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_client_errors_are_not_retried(self):
+        self.respond((404, {}))
+
+        with self.assertRaises(APIClientError):
+            self.client.set_token()
+
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_backoff_grows_and_decays(self):
+        self.respond(
+            (200, {"response_code": 5}),
+            (200, {"response_code": 5}),
+            (200, {"response_code": 0, "token": "x"}),
+        )
+        self.client.set_token()
+
+        self.assertEqual(self.client.backoff, StubOpenTDBClient.BACKOFF_BASE)
+
+        self.respond((200, {"response_code": 0, "token": "y"}))
+        self.client.set_token()
+
+        self.assertEqual(self.client.backoff, 0)
+
+    def test_retries_are_limited(self):
+        self.respond(*[(200, {"response_code": 5})] * (OpenTDBClient.RETRIES + 1))
+
+        with self.assertRaises(APIClientError):
+            self.client.set_token()
+
+        self.assertEqual(len(self.server.requests), OpenTDBClient.RETRIES + 1)
+        self.assertEqual(self.client.backoff, StubOpenTDBClient.BACKOFF_MAX)
+
+    def test_other_response_codes_fail(self):
+        self.respond((200, {"response_code": 2}))
+
+        with self.assertRaises(APIClientError):
+            self.client.set_token()
+
+        self.assertEqual(len(self.server.requests), 1)
+
+
+class SeedDbTests(LocalCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.opentdb = StubOpenTDB({9: ("General Knowledge", 120), 10: ("Books", 7)})
+        self.server = start_stub_server(self, self.opentdb)
+
+        for name, value in [
+            ("BASE_URL", f"http://127.0.0.1:{self.server.server_port}"),
+            ("RATE_INTERVAL", 0.001),
+        ]:
+            patcher = mock.patch.object(OpenTDBClient, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def seed(self, *args):
+        call_command("seed_db", *args, "--no-cache", stdout=StringIO())
+
+    def question_counts(self):
+        return {
+            quiz.external_id: quiz.question_set.count() for quiz in Quiz.objects.all()
+        }
+
+    def requested_amounts(self):
+        amounts = {}
+
+        for path, _ in self.server.requests:
+            params = dict(parse_qsl(urlsplit(path).query))
+
+            if urlsplit(path).path == "/api.php":
+                amounts.setdefault(int(params["category"]), []).append(
+                    int(params["amount"])
+                )
+
+        return amounts
+
+    def test_requests_amounts_from_question_counts(self):
+        self.seed("30")
+        self.assertEqual(self.requested_amounts(), {9: [30], 10: [7]})
+
+        # The resumed category's token has 90 questions left
+        self.seed("--all")
+        self.assertEqual(self.requested_amounts(), {9: [30, 50, 40], 10: [7]})
+        self.assertEqual(self.question_counts(), {"opentdb:9": 120, "opentdb:10": 7})
+
+    def test_halves_amounts_when_question_count_is_too_high(self):
+        self.opentdb.reported_counts[10] = 12
+
+        self.seed("--all")
+
+        self.assertEqual(self.requested_amounts()[10], [12, 6, 6, 3, 1, 1])
+        self.assertEqual(self.question_counts()["opentdb:10"], 7)
+        self.assertTrue(HarvestCheckpoint.objects.get(category_id=10).completed)
+
+    def test_interrupted_batch_is_still_written(self):
+        write_batch = SeedDbCommand.write_batch
+        calls = []
+
+        def interrupt_first(command, *args):
+            calls.append(args)
+
+            if len(calls) == 1:
+                raise KeyboardInterrupt
+
+            return write_batch(command, *args)
+
+        with mock.patch.object(SeedDbCommand, "write_batch", interrupt_first):
+            self.seed("--all")
+
+        self.seed("--all")
+
+        self.assertEqual(self.question_counts(), {"opentdb:9": 120, "opentdb:10": 7})
+
+    def test_reseeding_adds_no_duplicates(self):
+        self.seed("--all")
+        HarvestCheckpoint.objects.all().delete()
+        self.seed("--all")
+
+        self.assertEqual(self.question_counts(), {"opentdb:9": 120, "opentdb:10": 7})
+
+    def test_resumes_categories_through_response_cache(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+
+        for max_questions in ("50", "100"):
+            call_command(
+                "seed_db", max_questions, "--cache-dir", cache_dir, stdout=StringIO()
+            )
+
+        self.assertEqual(self.question_counts()["opentdb:9"], 100)
+        self.assertEqual(
+            HarvestCheckpoint.objects.get(category_id=9).fetched_count, 100
+        )
+
+        # Replays serve the recorded batches without network access
+        Quiz.objects.all().delete()
+        request_count = len(self.server.requests)
+        call_command(
+            "seed_db", "50", "--replay", "--cache-dir", cache_dir, stdout=StringIO()
+        )
+
+        self.assertEqual(self.question_counts(), {"opentdb:9": 50, "opentdb:10": 7})
+        self.assertEqual(len(self.server.requests), request_count)
+
+    def test_adopts_quizzes_seeded_without_external_id(self):
+        legacy = Quiz.objects.create(title="General Knowledge")
+        Question.objects.create(
+            quiz=legacy, content=self.opentdb.question(9, 0)["question"]
+        )
+
+        self.seed("10")
+
+        legacy.refresh_from_db()
+        self.assertEqual(legacy.external_id, "opentdb:9")
+        self.assertEqual(Quiz.objects.filter(title="General Knowledge").count(), 1)
+        self.assertEqual(legacy.question_set.count(), 10)
+
+    def test_refresh_adds_new_questions_of_completed_categories(self):
+        self.seed("--all")
+        self.opentdb.categories[10] = ("Books", 9)
+
+        self.seed("--all")
+        self.assertEqual(self.question_counts()["opentdb:10"], 7)
+
+        self.seed("--all", "--refresh")
+        self.assertEqual(self.question_counts(), {"opentdb:9": 120, "opentdb:10": 9})
+        self.assertTrue(HarvestCheckpoint.objects.get(category_id=10).completed)
+
+
+class ContentHashTests(LocalCacheTestCase):
+    def test_hash_follows_content(self):
+        quiz = Quiz.objects.create(title="Quiz")
+        question = Question.objects.create(quiz=quiz, content="What is &quot;X&quot;?")
+        original_hash = question.content_hash
+
+        self.assertEqual(content_hash('what  is "x"?'), original_hash)
+
+        question.content = "Another question"
+        question.save(update_fields=["content"])
+        question.refresh_from_db()
+
+        self.assertEqual(question.content_hash, content_hash("Another question"))
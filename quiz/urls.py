@@ -1,3 +1,4 @@
+from django.urls import path
 from rest_framework_nested.routers import SimpleRouter, NestedSimpleRouter
 from .views import QuizViewSet, QuestionViewSet, ResultViewSet
 
@@ -11,6 +12,18 @@ questions_router.register("questions", QuestionViewSet, basename="question")
 results_router = NestedSimpleRouter(router, "quizzes", lookup="quiz")
 results_router.register("results", ResultViewSet, basename="result")
 
-urlpatterns = router.urls
+urlpatterns = [
+    path(
+        "results/batch/",
+        ResultViewSet.as_view({"post": "batch"}),
+        name="result-batch",
+    ),
+    path(
+        "results/pending/<int:pk>/",
+        ResultViewSet.as_view({"get": "pending"}),
+        name="result-pending",
+    ),
+]
+urlpatterns += router.urls
 urlpatterns += questions_router.urls
 urlpatterns += results_router.urls
@@ -1,13 +1,22 @@
+import json
+import hashlib
 import logging
 
-from django.db.models import Prefetch
-from django.shortcuts import get_object_or_404
+from django.conf import settings
+from django.db import IntegrityError
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.utils.functional import cached_property
 
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
 from rest_framework.viewsets import GenericViewSet
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAdminUser, AllowAny
-from rest_framework.exceptions import NotFound
-from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+from rest_framework import generics, status
 from rest_framework.mixins import (
     ListModelMixin,
     RetrieveModelMixin,
@@ -15,29 +24,197 @@ from rest_framework.mixins import (
     CreateModelMixin,
 )
 
-from .models import Question, Quiz, Option, Result, AnsweredQuestion
+from .models import Quiz, Result, PendingResult, IdempotencyKey
+from .pagination import QuizCursorPagination
+from .renderers import EncodedQuestionList, FragmentJSONRenderer
 from .serializers import (
     QuizSerializer,
+    QuizValuesSerializer,
     QuestionSerializer,
     CreateResultSerializer,
+    BatchCreateResultSerializer,
+    BatchResultItemSerializer,
     ResultSerializer,
+    ResultValuesSerializer,
+)
+from .services.attempts import mint_attempt_token
+from .services.cache import TieredCache
+from .services.idempotency import idempotency_store
+from .services.reviews import review_queryset, store_review, store_reviews
+from .services.submissions import build_result, read_submission, save_results
+from .services.question_bank import question_bank_cache
+from .services.sampling import question_sampler
+from .services.shuffling import new_seed
+from .services.stats import read_quiz_stats
+from .services.write_behind import enqueue_result, result_flusher
+from .services.versions import (
+    get_catalogue_version,
+    get_quiz_version,
+    pinned_versions,
+    version_timestamp,
 )
 
 
 logger = logging.getLogger(__name__)
 
+response_cache = TieredCache("quiz-responses", max_bytes=32 * 1024 * 1024)
+
+
+class PinnedVersionsMixin:
+    # Quiz content versions are read once per request rather than by each
+    # cached question bank and answer key lookup
+    def dispatch(self, request, *args, **kwargs):
+        with pinned_versions():
+            return super().dispatch(request, *args, **kwargs)
+
+
+class SparseFieldsMixin:
+    # Fields served by `?view=summary`
+    summary_fields = None
+
+    @cached_property
+    def requested_fields(self):
+        if self.request.query_params.get("view", None) == "summary":
+            return self.summary_fields
+
+        fields = self.request.query_params.get("fields", None)
+
+        if fields:
+            return [name.strip() for name in fields.split(",") if name.strip()]
+
+        return None
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["fields"] = self.requested_fields
+
+        return context
+
+
+class ValuesSerializerMixin:
+    # Read actions listed in `values_actions` are served by
+    # `values_serializer_class` from `.values()` rows when one is set.
+    values_serializer_class = None
+    values_actions = ["list", "retrieve"]
+
+    @property
+    def uses_values_serializer(self):
+        return (
+            self.values_serializer_class is not None
+            and self.action in self.values_actions
+        )
+
+    def get_serializer_class(self):
+        if self.uses_values_serializer:
+            return self.values_serializer_class
+
+        return super().get_serializer_class()
+
+    def get_values_lookups(self):
+        return self.get_serializer().lookups
+
+
+class IdempotencyMixin:
+    # A request retried with the same `Idempotency-Key` header replays the
+    # stored response of the first attempt instead of running its handler
+    # again; concurrent duplicates wait for the first one to finish.
+    REPLAYED_HEADERS = ["Location", "Preference-Applied"]
+
+    def idempotent_response(self, handler, request, *args, **kwargs):
+        key = request.headers.get("Idempotency-Key", None)
+
+        if key is None:
+            return handler(request, *args, **kwargs)
+
+        if not key or len(key) > IdempotencyKey._meta.get_field("key").max_length:
+            raise ValidationError(
+                {"Idempotency-Key": "Must be between 1 and 255 characters long"}
+            )
+
+        payload = json.dumps(request.data, sort_keys=True, default=str)
+        fingerprint = hashlib.sha256(f"{request.path} {payload}".encode()).hexdigest()
+        record, claimed = idempotency_store.claim(key, fingerprint)
+
+        if record is None:
+            return Response(
+                {"detail": "A request with this idempotency key is in progress"},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        if not claimed:
+            if record.fingerprint != fingerprint:
+                return Response(
+                    {"detail": "This idempotency key was used for another request"},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+
+            logger.info(f"Idempotent request replayed - Key: {key}")
+            response = Response(
+                json.loads(bytes(record.response)), status=record.status_code
+            )
+            response["Idempotent-Replayed"] = "true"
+
+            for header, value in record.headers.items():
+                response[header] = value
+
+            return response
+
+        try:
+            try:
+                response = handler(request, *args, **kwargs)
+            except APIException as exc:
+                response = self.handle_exception(exc)
+        except BaseException:
+            idempotency_store.release(record)
+            raise
+
+        if response.status_code >= 500:
+            idempotency_store.release(record)
+        else:
+            idempotency_store.complete(
+                record,
+                response.status_code,
+                {
+                    header: response[header]
+                    for header in self.REPLAYED_HEADERS
+                    if response.has_header(header)
+                },
+                JSONRenderer().render(response.data),
+            )
+
+        return response
+
 
 class QuizViewSet(
-    ListModelMixin, RetrieveModelMixin, DestroyModelMixin, GenericViewSet
+    PinnedVersionsMixin,
+    SparseFieldsMixin,
+    ValuesSerializerMixin,
+    ListModelMixin,
+    RetrieveModelMixin,
+    DestroyModelMixin,
+    GenericViewSet,
 ):
+    CACHE_TTL = 60 * 60  # seconds
+
     serializer_class = QuizSerializer
+    values_serializer_class = QuizValuesSerializer
+    pagination_class = QuizCursorPagination
+    summary_fields = ["id", "title"]
 
     def get_queryset(self):
         queryset = Quiz.objects.order_by("id")
-        limit = self.request.query_params.get("limit", None)
 
-        if limit and limit.isdigit() and int(limit) > 0:
-            return queryset[: int(limit)]
+        if self.uses_values_serializer:
+            return queryset.values(*self.get_values_lookups())
+
+        if self.action != "destroy" and self.requested_fields is not None:
+            serializer_fields = self.get_serializer_class()().fields
+            columns = [
+                serializer_fields[name].source
+                for name in self.requested_fields
+                if name in serializer_fields
+            ]
+            queryset = queryset.only("id", *columns)
 
         return queryset
 
@@ -46,68 +223,184 @@ class QuizViewSet(
             return [IsAdminUser()]
         return [AllowAny()]
 
+    def get_validators(self, version):
+        # The same content version renders differently per query string and
+        # negotiated format, so both are folded into the ETag.
+        variant = f"{self.request.get_full_path()} {self.request.headers.get('Accept')}"
+        digest = hashlib.md5(variant.encode(), usedforsecurity=False).hexdigest()
+
+        return quote_etag(f"{version}-{digest[:16]}"), version_timestamp(version)
+
+    def conditional_response(self, version, handler, request, *args, **kwargs):
+        # The data is built, or read from the response cache, before the
+        # validators are compared, so a quiz that does not exist is a 404
+        # whatever version its id was given
+        cache_key = hashlib.md5(
+            request.build_absolute_uri().encode(), usedforsecurity=False
+        ).hexdigest()
+        data = response_cache.get_or_build(
+            f"{self.action}:{cache_key}",
+            lambda: handler(request, *args, **kwargs).data,
+            version=version,
+            ttl=self.CACHE_TTL,
+        )
+
+        etag, last_modified = self.get_validators(version)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        ) or Response(data)
+
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response["ETag"] = etag
+            response["Last-Modified"] = http_date(last_modified)
+
+        return response
+
     def list(self, request, *args, **kwargs):
         logger.info("Quiz list fetched")
-        return super().list(request, *args, **kwargs)
+
+        return self.conditional_response(
+            get_catalogue_version(), super().list, request, *args, **kwargs
+        )
 
     def retrieve(self, request, *args, **kwargs):
         logger.info(f"Quiz retrieved - Quiz ID: {self.kwargs['pk']}")
 
-        return super().retrieve(request, *args, **kwargs)
+        if not self.kwargs["pk"].isdigit():
+            return super().retrieve(request, *args, **kwargs)
+
+        return self.conditional_response(
+            get_quiz_version(int(self.kwargs["pk"])),
+            super().retrieve,
+            request,
+            *args,
+            **kwargs,
+        )
+
+    @action(detail=True, methods=["get"])
+    def stats(self, request, *args, **kwargs):
+        quiz = self.get_object()
 
+        logger.info(f"Quiz stats fetched - Quiz ID: {quiz.id}")
+        return Response({"quiz": quiz.id, **read_quiz_stats(quiz.id)})
 
-class QuestionViewSet(ListModelMixin, GenericViewSet):
+
+class QuestionViewSet(PinnedVersionsMixin, ListModelMixin, GenericViewSet):
     serializer_class = QuestionSerializer
+    renderer_classes = [FragmentJSONRenderer, BrowsableAPIRenderer]
+
+    @cached_property
+    def question_bank(self):
+        quiz_id = self.kwargs["quiz_pk"]
+        question_bank = (
+            question_bank_cache.get(int(quiz_id)) if quiz_id.isdigit() else None
+        )
+
+        if question_bank is None:
+            raise Http404
+
+        return question_bank
 
     def get_queryset(self):
-        quiz = get_object_or_404(Quiz, pk=self.kwargs["quiz_pk"])
+        question_ids = question_sampler.sample(
+            self.question_bank, self.question_bank.questions_per_attempt
+        )
 
-        return (
-            Question.objects.prefetch_related(
-                Prefetch("options", queryset=Option.objects.order_by("?"))
-            )
-            .filter(quiz_id=quiz.id)
-            .order_by("?")
-        )[: quiz.questions_per_attempt]
+        return [self.question_bank.questions[pk] for pk in question_ids]
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["option_seed"] = self.option_seed
+
+        return context
 
     def list(self, request, *args, **kwargs):
+        self.option_seed = new_seed()
+
         logger.info(f"Question list fetched - Quiz ID: {self.kwargs['quiz_pk']}")
-        return super().list(request, *args, **kwargs)
+        questions = EncodedQuestionList(
+            self.question_bank, self.get_queryset(), self.get_serializer_context()
+        )
+        attempt_token = mint_attempt_token(
+            quiz_id=int(self.kwargs["quiz_pk"]),
+            question_ids=questions.question_ids,
+            option_seed=self.option_seed,
+        )
+
+        response = Response(questions)
+        response["X-Attempt-Seed"] = str(self.option_seed)
+        response["X-Attempt-Token"] = attempt_token
+
+        return response
 
 
-class ResultViewSet(CreateModelMixin, RetrieveModelMixin, GenericViewSet):
+class ResultViewSet(
+    PinnedVersionsMixin,
+    SparseFieldsMixin,
+    ValuesSerializerMixin,
+    IdempotencyMixin,
+    CreateModelMixin,
+    RetrieveModelMixin,
+    GenericViewSet,
+):
+    serializer_class = ResultSerializer
+    values_serializer_class = ResultValuesSerializer
+    summary_fields = [
+        "id",
+        "quiz",
+        "total_answered",
+        "total_correct",
+        "percentage_score",
+    ]
+
+    @property
+    def wants_answered_questions(self):
+        requested_fields = self.requested_fields
+        return requested_fields is None or "answered_questions" in requested_fields
+
+    @property
+    def uses_values_serializer(self):
+        # Full results are served from their stored review document
+        return super().uses_values_serializer and not self.wants_answered_questions
+
     def get_queryset(self):
-        ordered_questions_prefetch = Prefetch(
-            "answered_questions",
-            queryset=AnsweredQuestion.objects.order_by("position_in_quiz"),
-        )
-        all_options_prefetch = Prefetch(
-            "answered_questions__question__options",
-            queryset=Option.objects.order_by("?"),
-        )
-        return (
-            Result.objects.filter(quiz_id=self.kwargs["quiz_pk"])
-            .select_related("quiz")
-            .prefetch_related(
-                ordered_questions_prefetch,
-                "answered_questions__selected_option",
-                all_options_prefetch,
-            )
-        )
+        if self.wants_answered_questions:
+            return review_queryset().filter(quiz_id=self.kwargs["quiz_pk"])
+
+        queryset = Result.objects.filter(quiz_id=self.kwargs["quiz_pk"])
+
+        if self.uses_values_serializer:
+            return queryset.values(*self.get_values_lookups())
+        columns = [
+            "id",
+            "quiz_id",
+            "total_answered",
+            "total_correct",
+            "percentage_score",
+        ]
+
+        if "quiz" in self.requested_fields:
+            queryset = queryset.select_related("quiz")
+            columns.append("quiz__title")
+
+        queryset = queryset.only(*columns)
+
+        return queryset
 
     def get_serializer_class(self):
         if self.action == "create":
             return CreateResultSerializer
+        if self.action == "batch":
+            return BatchCreateResultSerializer
 
-        return ResultSerializer
+        return super().get_serializer_class()
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
-        quiz_id = self.kwargs["quiz_pk"]
 
         if self.action == "create":
             try:
-                quiz = Quiz.objects.get(pk=quiz_id)
+                quiz = Quiz.objects.get(pk=self.kwargs["quiz_pk"])
             except Quiz.DoesNotExist:
                 quiz = None
 
@@ -126,14 +419,77 @@ class ResultViewSet(CreateModelMixin, RetrieveModelMixin, GenericViewSet):
 
         return serializer.save()
 
+    @property
+    def responds_async(self):
+        # Clients opt into write-behind per request with RFC 7240's
+        # `Prefer: respond-async`, when the deployment enables it
+        prefer = self.request.headers.get("Prefer", "")
+        return settings.RESULT_WRITE_BEHIND and "respond-async" in prefer.lower()
+
+    def get_ticket_response(self, pending_result):
+        data = {"ticket": pending_result.id, "status": "pending"}
+        response_status = status.HTTP_202_ACCEPTED
+
+        if pending_result.failed:
+            data["status"] = "failed"
+            response_status = status.HTTP_200_OK
+        elif pending_result.result_id is not None:
+            data["status"] = "created"
+            data["result"] = pending_result.result_id
+            response_status = status.HTTP_200_OK
+
+        response = Response(data, status=response_status)
+
+        if data["status"] == "created":
+            response["Location"] = reverse(
+                "result-detail",
+                kwargs={
+                    "quiz_pk": pending_result.quiz_id,
+                    "pk": pending_result.result_id,
+                },
+                request=self.request,
+            )
+        elif data["status"] == "pending":
+            response["Location"] = reverse(
+                "result-pending", kwargs={"pk": pending_result.id}, request=self.request
+            )
+
+        return response
+
     def create(self, request, *args, **kwargs):
+        return self.idempotent_response(self.create_result, request, *args, **kwargs)
+
+    def create_result(self, request, *args, **kwargs):
         create_serializer = self.get_serializer(data=request.data)
         create_serializer.is_valid(raise_exception=True)
 
+        if self.responds_async:
+            quiz = create_serializer.context["quiz"]
+
+            if not quiz:
+                raise NotFound(
+                    detail=f"The specified quiz of id `{self.kwargs['quiz_pk']}` "
+                    "does not exist"
+                )
+
+            pending_result = enqueue_result(
+                quiz, read_submission(create_serializer.validated_data)
+            )
+            logger.info(
+                f"Result queued - Ticket: {pending_result.id} - Quiz ID: {quiz.id}"
+            )
+
+            response = self.get_ticket_response(pending_result)
+            response["Preference-Applied"] = "respond-async"
+
+            return response
+
         instance = self.perform_create(create_serializer)
 
-        prefetched_instance = self.get_queryset().get(pk=instance.id)
-        return_serializer = ResultSerializer(prefetched_instance)
+        # The created instance comes back with its answered questions and
+        # their content attached, so it is rendered without a re-fetch.
+        return_serializer = ResultSerializer(instance)
+        store_review(instance.id, return_serializer.data)
 
         logger.info(
             f"Result created - Result ID: {instance.id} - "
@@ -142,10 +498,158 @@ class ResultViewSet(CreateModelMixin, RetrieveModelMixin, GenericViewSet):
 
         return Response(return_serializer.data, status=status.HTTP_201_CREATED)
 
+    def batch(self, request, *args, **kwargs):
+        batch_serializer = self.get_serializer(data=request.data)
+        batch_serializer.is_valid(raise_exception=True)
+        items = batch_serializer.validated_data["results"]
+
+        # Quizzes are looked up once for the whole batch; question banks and
+        # answer keys are shared per quiz through their caches.
+        item_serializers = [BatchResultItemSerializer(data=item) for item in items]
+        quizzes = Quiz.objects.in_bulk(
+            {
+                item_serializer.validated_data["quiz"]
+                for item_serializer in item_serializers
+                if item_serializer.is_valid()
+            }
+        )
+
+        outcomes = [None] * len(items)
+        submissions, positions = [], []
+
+        for position, (item, item_serializer) in enumerate(
+            zip(items, item_serializers)
+        ):
+            if not item_serializer.is_valid():
+                outcomes[position] = {
+                    "status": status.HTTP_400_BAD_REQUEST,
+                    "errors": item_serializer.errors,
+                }
+                continue
+
+            quiz_id = item_serializer.validated_data["quiz"]
+            quiz = quizzes.get(quiz_id, None)
+
+            if quiz is None:
+                outcomes[position] = {
+                    "status": status.HTTP_404_NOT_FOUND,
+                    "errors": {
+                        "quiz": f"The specified quiz of id `{quiz_id}` does not exist"
+                    },
+                }
+                continue
+
+            context = self.get_serializer_context()
+            context["quiz"] = quiz
+            create_serializer = CreateResultSerializer(data=item, context=context)
+
+            if not create_serializer.is_valid():
+                outcomes[position] = {
+                    "status": status.HTTP_400_BAD_REQUEST,
+                    "errors": create_serializer.errors,
+                }
+                continue
+
+            submissions.append(
+                (quiz, read_submission(create_serializer.validated_data))
+            )
+            positions.append(position)
+
+        saved = self.save_batch(submissions)
+        instances = [instance for instance in saved if instance is not None]
+        reviews = [ResultSerializer(instance).data for instance in instances]
+        store_reviews(zip(instances, reviews))
+        reviews = iter(reviews)
+
+        for position, instance in zip(positions, saved):
+            if instance is None:
+                outcomes[position] = {
+                    "status": status.HTTP_400_BAD_REQUEST,
+                    "errors": {"non_field_errors": ["The result could not be saved"]},
+                }
+            else:
+                outcomes[position] = {
+                    "status": status.HTTP_201_CREATED,
+                    "result": next(reviews),
+                }
+
+        logger.info(
+            f"Result batch submitted - Count: {len(items)} - "
+            f"Created: {len(instances)}"
+        )
+
+        return Response({"results": outcomes})
+
+    def save_batch(self, submissions):
+        # Returns the saved result of each (quiz, submission) pair, or None
+        # for submissions the database rejected
+        if not submissions:
+            return []
+
+        try:
+            return save_results(
+                [build_result(quiz, **submission) for quiz, submission in submissions]
+            )
+        except IntegrityError:
+            logger.warning("Result batch failed, saving results one by one")
+
+        saved = []
+
+        for quiz, submission in submissions:
+            try:
+                saved.extend(save_results([build_result(quiz, **submission)]))
+            except IntegrityError:
+                logger.error(
+                    f"Result creation failed - Quiz ID: {quiz.id}", exc_info=True
+                )
+                saved.append(None)
+
+        return saved
+
+    def pending(self, request, *args, **kwargs):
+        pending_result = generics.get_object_or_404(
+            PendingResult.objects.only("id", "quiz_id", "result_id", "failed"),
+            pk=self.kwargs["pk"],
+        )
+
+        if pending_result.result_id is None and not pending_result.failed:
+            # Rows queued before a worker restart are picked up on the next poll
+            result_flusher.notify()
+
+        return self.get_ticket_response(pending_result)
+
     def retrieve(self, request, *args, **kwargs):
         logger.warning(
             f"Result retrieved - Result ID: {self.kwargs['pk']} - "
             f"Quiz ID: {self.kwargs['quiz_pk']}"
         )
 
-        return super().retrieve(request, *args, **kwargs)
+        if not self.wants_answered_questions:
+            return super().retrieve(request, *args, **kwargs)
+
+        review = generics.get_object_or_404(
+            Result.objects.filter(quiz_id=self.kwargs["quiz_pk"]).values_list(
+                "review", flat=True
+            ),
+            pk=self.kwargs["pk"],
+        )
+
+        if review is None:
+            # Results created before reviews were materialized, or whose
+            # review was invalidated by a content edit, are rebuilt lazily.
+            instance = self.get_object()
+            review = store_review(instance.id, ResultSerializer(instance).data)
+
+        requested_fields = self.requested_fields
+
+        if requested_fields is None and request.accepted_renderer.format == "json":
+            return HttpResponse(
+                bytes(review), content_type=request.accepted_renderer.media_type
+            )
+
+        data = json.loads(bytes(review))
+
+        if requested_fields is not None:
+            data = {key: data[key] for key in data if key in requested_fields}
+
+        return Response(data)
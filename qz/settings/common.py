@@ -1,6 +1,8 @@
 import os
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
+
 from .. import __version__
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -86,12 +88,40 @@ USE_I18N = True
 USE_TZ = True
 
 
+QUIZ_LIST_PAGE_SIZE = int(os.environ.get("QUIZ_LIST_PAGE_SIZE", 24))
+
+QUIZ_LIST_MAX_PAGE_SIZE = int(os.environ.get("QUIZ_LIST_MAX_PAGE_SIZE", 100))
+
+# Queue result submissions sent with `Prefer: respond-async` and write
+# them in batches from a background flusher
+RESULT_WRITE_BEHIND = os.environ.get("RESULT_WRITE_BEHIND", "False") == "True"
+
+# Layout new results' answers are written in: "rows" of AnsweredQuestion or
+# "packed" into Result.answers. Both layouts are always readable.
+RESULT_ANSWER_STORAGE = os.environ.get("RESULT_ANSWER_STORAGE", "rows")
+
+# Directory of recorded OpenTDB responses used by `seed_db`
+OPENTDB_CACHE_DIR = os.environ.get("OPENTDB_CACHE_DIR", BASE_DIR / "opentdb_cache")
+
+CORS_ALLOW_HEADERS = [*default_headers, "idempotency-key", "prefer"]
+
+CORS_EXPOSE_HEADERS = ["X-Attempt-Seed", "X-Attempt-Token", "Idempotent-Replayed"]
+
+
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
 STATIC_URL = "static/"
 
 DEFAULT_FILE_STORAGE = "cloudinary_storage.storage.MediaCloudinaryStorage"
 
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ.get("CACHE_LOCATION", BASE_DIR / ".cache"),
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
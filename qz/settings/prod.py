@@ -12,3 +12,14 @@ ALLOWED_HOSTS = [os.environ.get("SITE_HOST_NAME")]
 CORS_ALLOWED_ORIGINS = [os.environ.get("CLIENT_URL")]
 
 DATABASES = {"default": dj_database_url.config()}
+
+# Shared across all web workers and dynos; create the table with
+# `python manage.py createcachetable`
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "qz_cache",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
+}